@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+Compare the JSON backends sopel-twitter can decode API responses with.
+
+Run from the repository root::
+
+    python benchmarks/bench_json.py [-n NUMBER]
+
+Each fixture in ``benchmarks/fixtures`` is a v1.1 API response in extended
+mode. Every installed backend decodes each one; the stdlib ``json`` row is
+the baseline the others are compared against. The fixtures were put together
+by hand to match the shape of real responses, so they carry the same fields,
+entities, and profile clutter, but none of the IDs or links are real.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# import the plugin's modules directly, so sopel doesn't need to be installed
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'sopel_modules', 'twitter'))
+
+from decoders import available_backends  # noqa: E402
+
+
+def load_fixtures():
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(HERE, 'fixtures', '*.json'))):
+        with open(path, 'rb') as f:
+            fixtures.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    return fixtures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=2000,
+                        help='decodes per timing run (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timing runs per backend; the best is kept '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    backends = available_backends()
+    print('backends: {}'.format(', '.join(name for name, _ in backends)))
+    print()
+    print('{:<16} {:>8} {:<10} {:>10} {:>8}'.format(
+        'fixture', 'bytes', 'backend', 'usec/op', 'speedup'))
+
+    for fixture, content in load_fixtures():
+        baseline = None
+        for name, loads in reversed(backends):  # stdlib json first
+            best = min(timeit.repeat(
+                lambda: loads(content), number=args.number, repeat=args.repeat))
+            usec = best / args.number * 1e6
+            if baseline is None:
+                baseline = usec
+            print('{:<16} {:>8} {:<10} {:>10.2f} {:>7.2f}x'.format(
+                fixture, len(content), name, usec, baseline / usec))
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# coding=utf-8
+"""
+Measure where the time goes when sopel-twitter answers a link.
+
+Run from the repository root, with the plugin's requirements installed::
+
+    python benchmarks/bench_plugin.py [--latency 0.05] [--error-rate 0.01]
+
+Every request goes to a :class:`~mock_twitter.MockTwitter` on localhost, and
+replies go nowhere, so no network or IRC connection is needed. Two runs:
+
+``stages``
+    Each fixture tweet and user is output ``--repeat`` times with empty
+    caches, timing each stage of the reply separately: fetch (the HTTP round
+    trip, including ``--latency``), decode, parse, format, time (formatting
+    the timestamp), and send.
+
+``load``
+    ``--channels`` simulated channels each paste ``--messages`` links as fast
+    as they're answered, all drawn from the same few tweets, so caching,
+    batching, and deduplication come into play. Reports throughput, reply
+    latency percentiles, and how many API requests it took.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import argparse
+from collections import defaultdict
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+from timeit import default_timer as timer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from mock_twitter import MockTwitter  # noqa: E402
+from sopel_modules.twitter import twitter  # noqa: E402
+from sopel_modules.twitter.backends import V1Backend  # noqa: E402
+from tests.fakes import FakeBot, Trigger  # noqa: E402
+
+
+class BenchBot(FakeBot):
+    """A :class:`~tests.fakes.FakeBot` whose replies go nowhere."""
+    def say(self, message, *args):
+        # roughly what sending costs before the socket: encoding the line
+        ('PRIVMSG #bench :' + message + '\r\n').encode('utf-8')
+
+
+class Stages(object):
+    """Collects how long each wrapped function takes, per call."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            start = timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = timer() - start
+                with self._lock:
+                    self.samples[name].append(elapsed)
+        return timed
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def instrument(bot, stages):
+    """Time the stages of the plugin's reply path."""
+    twitter.api_request = stages.wrap('fetch', twitter.api_request)
+    twitter.decode_json = stages.wrap('decode', twitter.decode_json)
+    backend = bot.memory['twitter_backend']
+    backend.parse_statuses = stages.wrap('parse', backend.parse_statuses)
+    backend.parse_users = stages.wrap('parse', backend.parse_users)
+    twitter.format_tweet = stages.wrap('format', twitter.format_tweet)
+    twitter.format_time = stages.wrap('time', twitter.format_time)
+    bot.say = stages.wrap('send', bot.say)
+
+
+def clear_caches(bot):
+    for key in ('twitter_tweets', 'twitter_users', 'twitter_errors'):
+        bot.memory[key].clear()
+
+
+def run_stages(bot, server, stages, repeat):
+    trigger = Trigger('#bench', 'bencher')
+    tweets = sorted(server.tweets)
+    users = sorted(server.users)
+    for _ in range(repeat):
+        for id_ in tweets:
+            clear_caches(bot)
+            tweet = twitter.lookup_status(bot, trigger, id_)
+            if tweet is not None:
+                twitter.say_status(bot, trigger, id_, tweet)
+        for sn in users:
+            clear_caches(bot)
+            user = twitter.lookup_user(bot, trigger, sn)
+            if user is not None:
+                twitter.say_user(bot, trigger, sn, user)
+
+    print('stages: {} tweets and {} users, {} times each, cold caches'.format(
+        len(tweets), len(users), repeat))
+    print('{:<8} {:>7} {:>10} {:>10} {:>10}'.format('stage', 'calls', 'mean ms', 'p50 ms', 'p95 ms'))
+    for name in ('fetch', 'decode', 'parse', 'format', 'time', 'send'):
+        samples = stages.samples.get(name)
+        if not samples:
+            continue
+        print('{:<8} {:>7} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+            name, len(samples), sum(samples) / len(samples) * 1000,
+            percentile(samples, 0.5) * 1000, percentile(samples, 0.95) * 1000))
+    print()
+
+
+def run_load(bot, server, channels, messages, seed):
+    clear_caches(bot)
+    ids = sorted(server.tweets)
+    latencies = []
+    unanswered = []
+    lock = threading.Lock()
+    requests_before = server.requests
+
+    def channel(n):
+        rng = random.Random(seed + n)
+        trigger = Trigger('#bench{}'.format(n), 'bencher')
+        for i in range(messages):
+            trigger.raw = 'message {}'.format(i)
+            id_ = rng.choice(ids)
+            # what get_url() does, but noting lookups that fail
+            start = timer()
+            tweet = twitter.lookup_status(bot, trigger, id_)
+            if tweet is not None:
+                twitter.say_status(bot, trigger, id_, tweet)
+            elapsed = timer() - start
+            with lock:
+                latencies.append(elapsed)
+                if tweet is None:
+                    unanswered.append(id_)
+
+    threads = [threading.Thread(target=channel, args=(n,)) for n in range(channels)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = timer() - start
+
+    total = channels * messages
+    print('load: {} channels x {} links, {} distinct tweets'.format(channels, messages, len(ids)))
+    print('  throughput      {:10.1f} links/s'.format(total / elapsed))
+    print('  latency p50     {:10.3f} ms'.format(percentile(latencies, 0.5) * 1000))
+    print('  latency p95     {:10.3f} ms'.format(percentile(latencies, 0.95) * 1000))
+    print('  latency p99     {:10.3f} ms'.format(percentile(latencies, 0.99) * 1000))
+    print('  API requests    {:10d}'.format(server.requests - requests_before))
+    print('  unanswered      {:10d}'.format(len(unanswered)))
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the stand-in API takes to answer (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of API requests that fail (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='outputs of each fixture in the stages run (default: %(default)s)')
+    parser.add_argument('--channels', type=int, default=8,
+                        help='simulated channels in the load run (default: %(default)s)')
+    parser.add_argument('--messages', type=int, default=50,
+                        help='links pasted per channel in the load run (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', choices=['stages', 'load'],
+                        help='run just one of the benchmarks')
+    args = parser.parse_args(argv)
+
+    homedir = tempfile.mkdtemp()
+    try:
+        with MockTwitter(args.latency, args.error_rate, seed=args.seed) as server:
+            bot = BenchBot(homedir, consumer_key='bench', consumer_secret='bench')
+            bot.memory['twitter_backend'] = V1Backend(
+                twitter.STATUS_PARAMS['1.1'], twitter.USER_PARAMS['1.1'], root=server.root)
+            stages = Stages()
+            instrument(bot, stages)
+            try:
+                if args.only in (None, 'stages'):
+                    run_stages(bot, server, stages, args.repeat)
+                if args.only in (None, 'load'):
+                    run_load(bot, server, args.channels, args.messages, args.seed)
+            finally:
+                twitter.shutdown(bot)
+    finally:
+        shutil.rmtree(homedir)
+
+
+if __name__ == '__main__':
+    main()
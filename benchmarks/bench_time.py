@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+Compare the ways sopel-twitter can work out when a tweet was posted.
+
+Run from the repository root::
+
+    python benchmarks/bench_time.py [-n NUMBER]
+
+``strptime`` is how ``created_at`` used to be parsed, and is the baseline the
+others are compared against: the hand-rolled parsers for v1.1 and v2
+timestamps, and deriving the time from a Snowflake status ID without looking
+at ``created_at`` at all.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import argparse
+from datetime import datetime
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# import the plugin's modules directly, so sopel doesn't need to be installed
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'sopel_modules', 'twitter'))
+
+from models import UTC, parse_created_at, parse_iso_timestamp, snowflake_time  # noqa: E402
+
+STATUS_ID = '1050118621198921728'
+CREATED_AT = 'Wed Oct 10 20:19:24 +0000 2018'
+ISO_TIMESTAMP = '2018-10-10T20:19:24.000Z'
+
+METHODS = [
+    ('strptime', lambda: datetime.strptime(
+        CREATED_AT, '%a %b %d %H:%M:%S +0000 %Y').replace(tzinfo=UTC)),
+    ('strptime (v2)', lambda: datetime.strptime(
+        ISO_TIMESTAMP, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=UTC)),
+    ('parse_created_at', lambda: parse_created_at(CREATED_AT)),
+    ('parse_iso_timestamp', lambda: parse_iso_timestamp(ISO_TIMESTAMP)),
+    ('snowflake_time', lambda: snowflake_time(STATUS_ID)),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--number', type=int, default=20000,
+                        help='calls per timing run (default: %(default)s)')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='timing runs per method; the best is kept '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = {fn() for _, fn in METHODS}
+    if len({stamp.replace(microsecond=0) for stamp in results}) != 1:
+        sys.exit('The methods disagree: {}'.format(sorted(results)))
+
+    print('{:<20} {:>10} {:>8}'.format('method', 'usec/op', 'speedup'))
+    baseline = None
+    for name, fn in METHODS:
+        best = min(timeit.repeat(fn, number=args.number, repeat=args.repeat))
+        usec = best / args.number * 1e6
+        if baseline is None:
+            baseline = usec
+        print('{:<20} {:>10.2f} {:>7.2f}x'.format(name, usec, baseline / usec))
+
+
+if __name__ == '__main__':
+    main()
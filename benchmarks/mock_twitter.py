@@ -0,0 +1,196 @@
+# coding=utf-8
+"""
+A local stand-in for the parts of api.twitter.com that sopel-twitter uses.
+
+Serves the fixtures in ``benchmarks/fixtures`` from the v1.1 endpoints the
+plugin requests (``statuses/show``, ``statuses/lookup``, ``users/show``, and
+``users/lookup``), with optional added latency and failures, so benchmarks
+can exercise the whole request path without touching the network::
+
+    with MockTwitter(latency=0.05, error_rate=0.01) as server:
+        url = server.root  # e.g. http://127.0.0.1:54321/1.1/
+
+Run it directly to serve until interrupted.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+MISSING_STATUS = {'errors': [{'code': 144, 'message': 'No status found with that ID.'}]}
+MISSING_USER = {'errors': [{'code': 50, 'message': 'User not found.'}]}
+NO_USERS = {'errors': [{'code': 17, 'message': 'No user matches for specified terms.'}]}
+OVER_CAPACITY = {'errors': [{'code': 130, 'message': 'Over capacity'}]}
+
+
+def load_fixtures(directory=FIXTURES):
+    """
+    Index the fixture tweets and users.
+
+    :param str directory: where the fixture files are
+    :return: dicts of tweets by ID and users by lowercased screen name,
+             including every tweet and user embedded in another
+    :rtype: tuple
+    """
+    tweets, users = {}, {}
+
+    def add_tweet(tweet):
+        tweets[tweet['id_str']] = tweet
+        add_user(tweet['user'])
+        if 'quoted_status' in tweet:
+            add_tweet(tweet['quoted_status'])
+
+    def add_user(user):
+        users.setdefault(user['screen_name'].lower(), user)
+
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        if 'screen_name' in data:
+            users[data['screen_name'].lower()] = data
+        else:
+            add_tweet(data)
+    return tweets, users
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        status, body = mock.respond(url.path, query)
+        content = json.dumps(body).encode('utf-8')
+
+        if mock.latency:
+            time.sleep(mock.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('x-rate-limit-limit', '900')
+        self.send_header('x-rate-limit-remaining', '899')
+        self.send_header('x-rate-limit-reset', str(int(time.time()) + 900))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class MockTwitter(object):
+    """
+    A v1.1 API stand-in, serving on a background thread.
+
+    :param float latency: seconds to wait before answering each request
+    :param float error_rate: the fraction of requests (0 to 1) to fail with a
+                             503 "Over capacity" error
+    :param int port: the port to listen on; by default, any free one
+    :param int seed: seeds which requests fail, for repeatable runs
+
+    Use it as a context manager, or call :meth:`start` and :meth:`stop`.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, port=0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.tweets, self.users = load_fixtures()
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def root(self):
+        """The base URL of the stand-in v1.1 API."""
+        return 'http://127.0.0.1:{}/1.1/'.format(self._server.server_address[1])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, path, query):
+        """
+        Answer an API request.
+
+        :param str path: the request path
+        :param dict query: the query parameters
+        :return: the HTTP status and decoded response body
+        :rtype: tuple
+        """
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+        if failed:
+            return 503, OVER_CAPACITY
+
+        match = re.match(r'^/1\.1/statuses/show/(\d+)\.json$', path)
+        if match:
+            tweet = self.tweets.get(match.group(1))
+            return (200, tweet) if tweet else (404, MISSING_STATUS)
+        if path == '/1.1/statuses/lookup.json':
+            ids = query.get('id', '').split(',')
+            return 200, {'id': {id_: self.tweets.get(id_) for id_ in ids}}
+        if path == '/1.1/users/show.json':
+            user = self.users.get(query.get('screen_name', '').lower())
+            return (200, user) if user else (404, MISSING_USER)
+        if path == '/1.1/users/lookup.json':
+            names = query.get('screen_name', '').lower().split(',')
+            users = [self.users[sn] for sn in names if sn in self.users]
+            return (200, users) if users else (404, NO_USERS)
+        return 404, {'errors': [{'code': 34, 'message': 'Sorry, that page does not exist.'}]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a stand-in Twitter API.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to delay each response (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests to fail (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    with MockTwitter(args.latency, args.error_rate, args.port) as server:
+        print('Serving {} tweets and {} users at {}'.format(
+            len(server.tweets), len(server.users), server.root))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
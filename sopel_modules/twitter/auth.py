@@ -0,0 +1,106 @@
+# coding=utf-8
+"""
+Application-only authentication for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import base64
+import json
+import threading
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+import httplib2
+
+from sopel.logger import get_logger
+
+from .client import APIUnavailable
+
+logger = get_logger(__name__)
+
+TOKEN_URL = 'https://api.twitter.com/oauth2/token'
+
+
+class BearerToken(object):
+    """
+    An application-only bearer token, obtained using consumer credentials.
+
+    :param str consumer_key: the app's consumer key
+    :param str consumer_secret: the app's consumer secret
+    :param int timeout: socket timeout for the token request
+    :param load: optional callable taking no arguments, returning a
+                 previously saved token (or ``None``)
+    :param save: optional callable taking a newly obtained token
+
+    Requests authenticated with a bearer token don't need to be signed, and
+    draw from the more generous app-only rate limits.
+    """
+    def __init__(self, consumer_key, consumer_secret, timeout=None, load=None, save=None):
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.timeout = timeout
+        self.load = load
+        self.save = save
+        self._token = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Get the current token, obtaining one if necessary.
+
+        :return: the bearer token
+        :rtype: str
+        :raise APIUnavailable: if a new token was needed and could not be
+                               obtained
+        """
+        with self._lock:
+            if self._token is None and not self._loaded and self.load is not None:
+                self._loaded = True
+                self._token = self.load()
+            if self._token is None:
+                self._token = self._fetch()
+                if self.save is not None:
+                    self.save(self._token)
+            return self._token
+
+    def invalidate(self, token):
+        """
+        Discard a token the API has rejected.
+
+        :param str token: the rejected token
+
+        Does nothing if another thread has already replaced that token.
+        """
+        with self._lock:
+            if self._token == token:
+                self._loaded = True  # the saved copy is no better
+                self._token = None
+
+    def _fetch(self):
+        credentials = '{}:{}'.format(quote(self.consumer_key), quote(self.consumer_secret))
+        credentials = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        try:
+            response, content = httplib2.Http(timeout=self.timeout).request(
+                TOKEN_URL, 'POST', body='grant_type=client_credentials',
+                headers={
+                    'Authorization': 'Basic ' + credentials,
+                    'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
+                })
+        except Exception as e:
+            raise APIUnavailable('{} requesting bearer token: {}'.format(type(e).__name__, e))
+
+        try:
+            data = json.loads(content.decode('utf-8'))
+            if response['status'] != '200' or data.get('token_type') != 'bearer':
+                raise ValueError(data)
+        except ValueError:
+            logger.error('%s error obtaining a bearer token; check consumer_key '
+                         'and consumer_secret: %r', response['status'], content)
+            raise APIUnavailable('Could not obtain a bearer token')
+
+        logger.info('Obtained a new bearer token')
+        return data['access_token']
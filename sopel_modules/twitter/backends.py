@@ -0,0 +1,212 @@
+# coding=utf-8
+"""
+API versions sopel-twitter can look tweets and users up with.
+
+Each backend knows how to build lookup URLs for its version of the API, and
+how to turn the decoded responses into :mod:`~.models` objects; making the
+requests themselves is left to the caller. Either way, the rest of the plugin
+sees the same :class:`~.models.Tweet` and :class:`~.models.User` objects.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+try:
+    from urllib.parse import quote
+except ImportError:
+    from urllib import quote
+
+from .models import (
+    ErrorResult, extract_error, extract_tweet, extract_tweet_v2, extract_user,
+    extract_user_v2)
+
+# statuses/lookup silently omits tweets it can't return, so use the same
+# error statuses/show would have given
+MISSING_STATUS = ErrorResult(144, 'No status found with that ID.')
+# likewise for users/lookup and users/show
+MISSING_USER = ErrorResult(50, 'User not found.')
+
+
+class V1Backend(object):
+    """
+    The v1.1 API.
+
+    :param status_params: a sequence of ``(name, value)`` query parameters
+                          for tweet lookups
+    :param user_params: likewise, for user lookups
+    :param str root: the API's base URL, if not the real one (e.g. for testing
+                     against a stand-in server)
+    """
+    name = '1.1'
+    root = 'https://api.twitter.com/1.1/'
+    suffix = '.json'
+    # whether the authors of looked-up tweets come with their whole profile
+    full_authors = True
+
+    def __init__(self, status_params=(), user_params=(), root=None):
+        self.status_params = tuple(status_params)
+        self.user_params = tuple(user_params)
+        if root is not None:
+            self.root = root
+
+    def url(self, path, params, **extra):
+        """
+        Build an API URL.
+
+        :param str path: the endpoint, relative to :attr:`root`
+        :param params: a sequence of ``(name, value)`` query parameters
+        :param extra: more query parameters, added after ``params``
+        :return: the full URL
+        :rtype: str
+
+        Values are percent-encoded, except for the commas separating the
+        items of a list.
+        """
+        query = list(params) + sorted(extra.items())
+        return '{}{}{}?{}'.format(
+            self.root, path, self.suffix,
+            '&'.join('{}={}'.format(name, quote('{}'.format(value).encode('utf-8'), safe=','))
+                     for name, value in query))
+
+    def statuses_url(self, ids):
+        """
+        Get the URL that looks up some tweets.
+
+        :param list ids: up to 100 status IDs
+        :rtype: str
+        """
+        if len(ids) == 1:
+            # statuses/show gives a more specific error if the tweet is missing
+            return self.url('statuses/show/{}'.format(ids[0]), self.status_params)
+        return self.url('statuses/lookup', self.status_params, id=','.join(ids), map='true')
+
+    def parse_statuses(self, data, ids):
+        """
+        Get the tweets from a response to :meth:`statuses_url`.
+
+        :param data: the decoded response
+        :param list ids: the status IDs that were looked up
+        :return: a dict mapping each status ID to its tweet or error
+        :rtype: dict
+        """
+        if data.get('errors', []):
+            return dict.fromkeys(ids, extract_error(data))
+        if len(ids) == 1:
+            return {ids[0]: extract_tweet(data)}
+
+        # with map=true, missing tweets are listed with a null value
+        tweets = data['id']
+        return {id_: extract_tweet(tweets[id_]) if tweets.get(id_) else MISSING_STATUS
+                for id_ in ids}
+
+    def users_url(self, names):
+        """
+        Get the URL that looks up some users.
+
+        :param list names: up to 100 lowercase screen names
+        :rtype: str
+        """
+        if len(names) == 1:
+            # users/show gives a more specific error if the user is missing
+            return self.url('users/show', self.user_params, screen_name=names[0])
+        return self.url('users/lookup', self.user_params, screen_name=','.join(names))
+
+    def parse_users(self, data, names):
+        """
+        Get the users from a response to :meth:`users_url`.
+
+        :param data: the decoded response
+        :param list names: the lowercase screen names that were looked up
+        :return: a dict mapping each screen name to its user or error
+        :rtype: dict
+        """
+        if isinstance(data, dict) and data.get('errors', []):
+            error = extract_error(data)
+            if error.code == 17:
+                # "No user matches for specified terms": none of them exist
+                error = MISSING_USER
+            return dict.fromkeys(names, error)
+        if isinstance(data, dict):
+            data = [data]
+
+        # users/lookup silently omits users it can't return
+        users = {user.screen_name.lower(): user for user in map(extract_user, data)}
+        return {sn: users.get(sn, MISSING_USER) for sn in names}
+
+
+class V2Backend(V1Backend):
+    """
+    The v2 API.
+
+    Lookups always go through the batch endpoints, which take up to 100 IDs
+    or usernames, and only return the fields asked for in the parameters.
+    """
+    name = '2'
+    root = 'https://api.twitter.com/2/'
+    suffix = ''
+    full_authors = False
+
+    # v1.1 error codes for v2 problem types, where they mean the same thing
+    PROBLEM_CODES = {
+        'https://api.twitter.com/2/problems/not-authorized-for-resource': 179,
+    }
+    # and for whole-request failures, which say nothing about the tweets or
+    # users asked for (and so are never cached)
+    STATUS_CODES = {
+        401: 32,   # Could not authenticate you
+        403: 32,
+        429: 88,   # Rate limit exceeded
+        503: 130,  # Over capacity
+    }
+
+    def statuses_url(self, ids):
+        return self.url('tweets', self.status_params, ids=','.join(ids))
+
+    def parse_statuses(self, data, ids):
+        includes = data.get('includes', {})
+        users = {user['id']: user for user in includes.get('users', [])}
+        tweets = {tweet['id']: tweet for tweet in includes.get('tweets', [])}
+        media = {item['media_key']: item for item in includes.get('media', [])}
+
+        results = self._errors(data, ids, 'ids', MISSING_STATUS)
+        for tweet in data.get('data', []):
+            results[tweet['id']] = extract_tweet_v2(tweet, users, tweets, media)
+        return results
+
+    def users_url(self, names):
+        return self.url('users/by', self.user_params, usernames=','.join(names))
+
+    def parse_users(self, data, names):
+        results = self._errors(data, names, 'usernames', MISSING_USER)
+        for user in data.get('data', []):
+            results[user['username'].lower()] = extract_user_v2(user)
+        return results
+
+    def _errors(self, data, keys, parameter, missing):
+        """
+        Get the errors in a v2 response, for each ID or username looked up.
+
+        Any key with no error of its own is ``missing``, until the caller
+        fills in the objects the response did include.
+        """
+        if 'title' in data:
+            # the whole request failed, e.g. with a 401 or 429
+            error = ErrorResult(
+                self.STATUS_CODES.get(data.get('status')),
+                data.get('detail') or data.get('title'))
+            return dict.fromkeys(keys, error)
+
+        results = dict.fromkeys(keys, missing)
+        for error in data.get('errors', []):
+            if error.get('parameter') != parameter:
+                continue  # e.g. a quoted tweet that couldn't be expanded
+            key = error.get('value', '').lower()
+            if key not in results:
+                continue
+            code = self.PROBLEM_CODES.get(error.get('type'))
+            if code is None and error.get('resource_type') == 'user' and \
+                    error.get('title') == 'Forbidden':
+                code = 63  # User has been suspended
+            results[key] = ErrorResult(code or missing.code, error.get('detail'))
+        return results
+
+
+BACKENDS = {backend.name: backend for backend in (V1Backend, V2Backend)}
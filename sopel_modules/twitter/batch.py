@@ -0,0 +1,301 @@
+# coding=utf-8
+"""
+Request coalescing, deduplication, and output ordering for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import itertools
+import threading
+import time
+
+from sopel.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Batch(object):
+    def __init__(self):
+        self.keys = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = {}
+        self.error = None
+
+
+class Coalescer(object):
+    """
+    Gather single-object lookups into batched API requests.
+
+    :param lookup: callable taking a list of keys and returning a dict mapping
+                   each key to its result
+    :param float window: seconds to wait for more keys before sending a batch
+    :param int max_size: the most keys to send in one batch
+
+    The first caller to ask for a key in a given group becomes the batch's
+    leader: it waits up to ``window`` seconds (or until the batch is full),
+    then performs one lookup on behalf of every caller that joined the batch
+    in the meantime. Everyone else just waits for the leader's results.
+    """
+    def __init__(self, lookup, window=0.05, max_size=100):
+        self.lookup = lookup
+        self.window = window
+        self.max_size = max_size
+        self._pending = {}  # group -> _Batch still accepting keys
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """The number of keys waiting for their batch to be sent."""
+        return sum(len(batch.keys) for batch in list(self._pending.values()))
+
+    def get(self, key, group=None):
+        """
+        Look up one key as part of a batch.
+
+        :param key: the key to look up
+        :param group: batches are only shared between callers that pass the
+                      same (hashable) group
+        :return: the result for ``key``, or ``None`` if ``lookup`` omitted it
+        :raise: whatever exception ``lookup`` raised, in every caller
+        """
+        with self._lock:
+            batch = self._pending.get(group)
+            leader = batch is None
+            if leader:
+                batch = self._pending[group] = _Batch()
+            if key not in batch.keys:
+                batch.keys.append(key)
+            if len(batch.keys) >= self.max_size:
+                del self._pending[group]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(group) is batch:
+                    del self._pending[group]
+            try:
+                batch.results = self.lookup(list(batch.keys))
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results.get(key)
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Share one in-progress call between concurrent callers asking for the same key.
+
+    Unlike :class:`Coalescer`, nothing waits for company: the first caller
+    runs straight away, and anyone asking for the same key while it is still
+    running gets its result instead of making their own call.
+    """
+    def __init__(self):
+        self._calls = {}  # key -> _Call in progress
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """The number of calls in progress."""
+        return len(self._calls)
+
+    def do(self, key, fn):
+        """
+        Call ``fn``, unless a call for ``key`` is already in progress.
+
+        :param key: a hashable identifying what ``fn`` fetches
+        :param fn: callable taking no arguments
+        :return: the return value of ``fn`` (whichever caller ran it)
+        :raise: whatever exception ``fn`` raised, in every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            self._run(key, call, fn)
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def start(self, key, fn):
+        """
+        Call ``fn`` on a background thread, unless a call for ``key`` is
+        already in progress.
+
+        :param key: a hashable identifying what ``fn`` fetches
+        :param fn: callable taking no arguments; anything it returns or
+                   raises is ignored, except by concurrent callers of
+                   :meth:`do` with the same ``key``
+        :return: whether a new call was started
+        :rtype: bool
+        """
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = _Call()
+
+        thread = threading.Thread(target=self._run, args=(key, call, fn))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Ticket(object):
+    def __init__(self, sequencer, group, order):
+        self.sequencer = sequencer
+        self.group = group
+        self.order = order
+        self.released = False
+        self.deferred = None  # callable waiting for this ticket's turn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def wait(self):
+        """
+        Block until every earlier ticket in this group has been released.
+
+        :return: ``False`` if the sequencer's timeout ran out first
+        :rtype: bool
+        """
+        return self.sequencer._wait(self)
+
+    def defer(self, fn):
+        """
+        Call ``fn`` once every earlier ticket in this group has been
+        released, then release this ticket, without blocking.
+
+        :param fn: callable taking no arguments
+
+        ``fn`` is called straight away if it's already this ticket's turn,
+        and otherwise by whichever thread releases the last earlier ticket.
+        Once a call is deferred, :meth:`release` leaves it to the sequencer.
+        """
+        self.sequencer._defer(self, fn)
+
+    def release(self):
+        """Let the next ticket in this group proceed."""
+        if self.deferred is None:
+            self.sequencer._release(self)
+
+
+class Sequencer(object):
+    """
+    Keep concurrent replies to one message in the order their links appeared.
+
+    :param float timeout: the longest :meth:`~_Ticket.wait` will block for
+                          earlier tickets
+
+    Sopel handles each link in its own thread, so replies can otherwise come
+    out in whatever order the lookups finish. Threads that mustn't block,
+    like the background fetch workers, :meth:`~_Ticket.defer` their replies
+    instead of waiting.
+
+    Ordering only covers tickets that have already been issued: a reply
+    can't wait for a ticket that its message's other thread hasn't taken
+    yet, so it's best-effort when a lookup finishes before then.
+    """
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self._groups = {}  # group -> list of unreleased tickets
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def ticket(self, group, position):
+        """
+        Take a place in line for a group.
+
+        :param group: a hashable identifying the message being replied to
+        :param int position: where the link appeared in the message
+        :return: a ticket to :meth:`~_Ticket.wait` on before replying, and
+                 :meth:`~_Ticket.release` afterward (or use it in a ``with``
+                 block); or to :meth:`~_Ticket.defer` the reply with
+        """
+        with self._cond:
+            ticket = _Ticket(self, group, (position, next(self._counter)))
+            self._groups.setdefault(group, []).append(ticket)
+        return ticket
+
+    def _blocked(self, ticket):
+        # caller must hold the lock
+        return any(other.order < ticket.order
+                   for other in self._groups.get(ticket.group, []))
+
+    def _wait(self, ticket):
+        deadline = time.time() + self.timeout
+        with self._cond:
+            while self._blocked(ticket):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _defer(self, ticket, fn):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.deferred = fn
+            if self._blocked(ticket):
+                return
+        self._run(ticket)
+
+    def _release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket = self._remove(ticket)
+        self._run(ticket)
+
+    def _remove(self, ticket):
+        # caller must hold the lock; returns the next ticket if its reply was
+        # deferred while waiting on this one
+        ticket.released = True
+        tickets = self._groups[ticket.group]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._groups[ticket.group]
+            return None
+        self._cond.notify_all()
+        ticket = min(tickets, key=lambda other: other.order)
+        return ticket if ticket.deferred is not None else None
+
+    def _run(self, ticket):
+        # a loop rather than recursion, however many replies were held back
+        while ticket is not None:
+            try:
+                ticket.deferred()
+            except Exception:
+                logger.exception('Error in deferred reply')
+            with self._cond:
+                ticket = self._remove(ticket)
@@ -0,0 +1,217 @@
+# coding=utf-8
+"""
+In-memory caches for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache(object):
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire.
+
+    :param int maxsize: the most entries to keep; the least recently used
+                        entry is evicted to make room for a new one
+    :param int ttl: the default number of seconds an entry stays valid
+    :param int stale_ttl: seconds an entry is kept after it stops being valid,
+                          for :meth:`lookup` to return as stale
+
+    A cache with a non-positive ``maxsize`` or ``ttl`` stores nothing.
+    """
+    def __init__(self, maxsize=256, ttl=300, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = max(0, stale_ttl)
+        self._data = OrderedDict()  # key -> (expires, value); stale from expires - stale_ttl
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """
+        Look up an unexpired entry.
+
+        :param key: the entry's key
+        :param default: what to return if there is no valid entry
+        :return: the cached value, or ``default``
+        """
+        value, fresh = self.lookup(key)
+        return value if fresh else default
+
+    def lookup(self, key):
+        """
+        Look up an entry, even if it's stale.
+
+        :param key: the entry's key
+        :return: the cached value (or ``None``), and whether it's still valid
+        :rtype: tuple
+
+        Values that stopped being valid less than ``stale_ttl`` seconds ago
+        are returned as not valid; older ones aren't returned at all.
+        """
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None, False
+            now = time.time()
+            if expires <= now:
+                self._discard(key)
+                return None, False
+            # mark as most recently used
+            del self._data[key]
+            self._data[key] = (expires, value)
+            return value, expires - self.stale_ttl > now
+
+    def set(self, key, value, ttl=None):
+        """
+        Store an entry, evicting the least recently used one if necessary.
+
+        :param key: the entry's key
+        :param value: the value to store
+        :param int ttl: seconds until the entry expires, if not the cache's
+                        default ``ttl``
+        """
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._store(key, value, ttl + self.stale_ttl)
+
+    def _store(self, key, value, ttl):
+        # caller must hold the lock
+        self._data.pop(key, None)
+        self._data[key] = (time.time() + ttl, value)
+        while len(self._data) > self.maxsize:
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key):
+        # caller must hold the lock; subclasses hook this to maintain indexes
+        return self._data.pop(key)[1]
+
+    def pop(self, key, default=None):
+        """
+        Remove an entry.
+
+        :param key: the entry's key
+        :param default: what to return if there is no such entry
+        :return: the removed value (even if expired), or ``default``
+        """
+        with self._lock:
+            try:
+                return self._discard(key)
+            except KeyError:
+                return default
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def expire(self):
+        """
+        Remove every expired entry.
+
+        :return: the number of entries removed
+        :rtype: int
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._data.items() if expires <= now]
+            for key in expired:
+                self._discard(key)
+        return len(expired)
+
+
+class UserCache(TTLCache):
+    """
+    A :class:`TTLCache` of user objects, keyed case-insensitively by screen name.
+
+    :param int maxsize: the most users to keep
+    :param int ttl: the default number of seconds a user stays valid
+
+    Users are also indexed by ID, which (unlike the screen name) never changes.
+    """
+    def __init__(self, maxsize=256, ttl=300):
+        super(UserCache, self).__init__(maxsize=maxsize, ttl=ttl)
+        self._ids = {}  # user ID -> screen name key
+
+    def get(self, screen_name, default=None):
+        return super(UserCache, self).get(screen_name.lower(), default)
+
+    def get_by_id(self, id_, default=None):
+        """
+        Look up an unexpired user by ID.
+
+        :param str id_: the user's ID
+        :param default: what to return if there is no valid entry
+        :return: the cached user, or ``default``
+        """
+        key = self._ids.get(id_)
+        if key is None:
+            return default
+        return super(UserCache, self).get(key, default)
+
+    def set(self, user, ttl=None):
+        """
+        Store a user object.
+
+        :param user: the user
+        :type user: :class:`~.models.User`
+        :param int ttl: seconds until the entry expires, if not the cache's
+                        default ``ttl``
+        """
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        key = user.screen_name.lower()
+        with self._lock:
+            old_key = self._ids.get(user.id)
+            if old_key is not None and old_key != key:
+                # the user changed their screen name
+                self._discard(old_key)
+            if key in self._data:
+                # drop the old entry through _discard(), in case the screen
+                # name now belongs to a different account
+                self._discard(key)
+            self._store(key, user, ttl + self.stale_ttl)
+            self._ids[user.id] = key
+
+    def refresh(self, user):
+        """
+        Replace a cached user with a newer copy, if it is cached at all.
+
+        :param user: the user (e.g. as embedded in a tweet)
+        :type user: :class:`~.models.User`
+        :return: whether a cached entry was replaced
+        :rtype: bool
+        """
+        if self.get_by_id(user.id) is None:
+            return False
+        self.set(user)
+        return True
+
+    def pop(self, screen_name, default=None):
+        return super(UserCache, self).pop(screen_name.lower(), default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._ids.clear()
+
+    def _discard(self, key):
+        user = super(UserCache, self)._discard(key)
+        if self._ids.get(user.id) == key:
+            del self._ids[user.id]
+        return user
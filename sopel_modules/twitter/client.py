@@ -0,0 +1,365 @@
+# coding=utf-8
+"""
+HTTP client management for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+# lookups made on a user's explicit request may use the reserved budget;
+# automatic ones (like link expansion) may not
+PRIORITY_LOW = 0
+PRIORITY_HIGH = 1
+
+
+class RateLimited(Exception):
+    """
+    Raised instead of making a request that would exceed the rate limit.
+
+    :param str endpoint: the rate-limited endpoint
+    :param float reset: when the endpoint's rate-limit window resets (as a
+                        Unix timestamp)
+    """
+    def __init__(self, endpoint, reset):
+        super(RateLimited, self).__init__(
+            'Rate limit for {} reached; resets in {:.0f}s'
+            .format(endpoint, reset - time.time()))
+        self.endpoint = endpoint
+        self.reset = reset
+
+
+class APIUnavailable(Exception):
+    """
+    Raised when the API can't be reached, or responds with a server error.
+    """
+
+
+class CircuitOpen(APIUnavailable):
+    """
+    Raised instead of making a request while the API is considered down.
+
+    :param float retry_at: when a request will next be attempted (as a Unix
+                           timestamp)
+    """
+    def __init__(self, retry_at):
+        super(CircuitOpen, self).__init__(
+            'Twitter API circuit is open; retrying in {:.0f}s'
+            .format(retry_at - time.time()))
+        self.retry_at = retry_at
+
+
+def endpoint_name(url):
+    """
+    Get the rate-limit family of an API URL.
+
+    :param str url: a full API URL
+    :return: the endpoint, as Twitter names it in rate-limit status responses
+             (e.g. ``/statuses/show/:id``)
+    :rtype: str
+    """
+    path = urlparse(url).path
+    path = re.sub(r'^/1\.1', '', path)
+    path = re.sub(r'\.json$', '', path)
+    return re.sub(r'/\d+$', '/:id', path)
+
+
+def close_connections(client):
+    """
+    Close any keep-alive connections held open by an ``httplib2`` client.
+
+    :param client: an ``httplib2.Http`` instance (or subclass)
+    """
+    for conn in list(client.connections.values()):
+        try:
+            conn.close()
+        except Exception:
+            pass
+    client.connections.clear()
+
+
+class RateLimiter(object):
+    """
+    Track each endpoint's remaining API budget, and ration what's left.
+
+    :param int reserve: requests per window to keep for high-priority lookups
+    :param int max_defer: the most seconds to delay a request until its
+                          window resets, rather than refusing it outright
+
+    Budgets come from the ``x-rate-limit-*`` headers of previous responses,
+    and are decremented optimistically as requests are sent, so concurrent
+    threads don't all spend the last request in a window.
+    """
+    def __init__(self, reserve=10, max_defer=5):
+        self.reserve = reserve
+        self.max_defer = max_defer
+        self._limits = {}  # endpoint -> [remaining, reset]
+        self._lock = threading.Lock()
+
+    def acquire(self, endpoint, priority=PRIORITY_LOW):
+        """
+        Spend one request from an endpoint's budget, waiting if necessary.
+
+        :param str endpoint: the endpoint about to be requested
+        :param int priority: :data:`PRIORITY_LOW` or :data:`PRIORITY_HIGH`
+        :raise RateLimited: if the budget is spent and the window won't reset
+                            within ``max_defer`` seconds
+        """
+        floor = 0 if priority >= PRIORITY_HIGH else self.reserve
+        now = time.time()
+        reset = self._spend(endpoint, floor, now)
+        if reset is None:
+            return
+
+        if reset - now > self.max_defer:
+            raise RateLimited(endpoint, reset)
+        time.sleep(reset - now)
+
+    def update(self, endpoint, response):
+        """
+        Update an endpoint's budget from an API response.
+
+        :param str endpoint: the endpoint that was requested
+        :param dict response: the ``httplib2`` response (headers and status)
+        """
+        try:
+            limit = [int(response['x-rate-limit-remaining']),
+                     int(response['x-rate-limit-reset'])]
+        except (KeyError, ValueError):
+            if response.get('status') != '429':
+                return
+            # rate limited without saying until when; assume a minute
+            limit = [0, time.time() + 60]
+
+        self._record(endpoint, limit)
+
+    def remaining(self, endpoint):
+        """
+        Get how many requests are left in an endpoint's budget.
+
+        :param str endpoint: the endpoint
+        :return: the number of requests, or ``None`` if it isn't known (or
+                 the window it was known for has reset)
+        :rtype: int
+        """
+        limit = self.status().get(endpoint)
+        if limit is None or limit[1] <= time.time():
+            return None
+        return limit[0]
+
+    def status(self):
+        """
+        Get a snapshot of every known endpoint's budget.
+
+        :return: a dict mapping endpoints to ``(remaining, reset)`` tuples
+        :rtype: dict
+        """
+        with self._lock:
+            return {endpoint: tuple(limit) for endpoint, limit in self._limits.items()}
+
+    def _spend(self, endpoint, floor, now):
+        """
+        Spend one request from an endpoint's budget, if it has more than
+        ``floor`` left (or isn't known).
+
+        :return: ``None`` if the request may go ahead, or else the time the
+                 budget resets
+        """
+        with self._lock:
+            limit = self._limits.get(endpoint)
+            if limit is None or limit[1] <= now:
+                return None
+            if limit[0] > floor:
+                limit[0] -= 1
+                return None
+            return limit[1]
+
+    def _record(self, endpoint, limit):
+        """Replace an endpoint's ``[remaining, reset]`` budget."""
+        with self._lock:
+            self._limits[endpoint] = limit
+
+
+class CircuitBreaker(object):
+    """
+    Stop sending requests to an API that keeps failing, until it recovers.
+
+    :param int threshold: consecutive failures after which the circuit opens
+    :param int cooldown: seconds to refuse requests for once it's open
+
+    After the cooldown, one request is let through as a probe ("half-open");
+    if it succeeds the circuit closes again, and if not it stays open for
+    another cooldown period.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, cooldown=30):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a request may be sent.
+
+        :raise CircuitOpen: if the circuit is open, or half-open with a probe
+                            request already in progress
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_at = self._opened_at + self.cooldown
+            if self.state == self.OPEN and retry_at <= time.time():
+                # this caller gets to find out whether the API is back
+                self.state = self.HALF_OPEN
+                return
+        raise CircuitOpen(retry_at)
+
+    def cancel(self):
+        """
+        Note that a request :meth:`allow` let through was never sent.
+
+        A probe that's given up lets the next request be the probe instead.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        """Note that a request succeeded."""
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """Note that a request failed."""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                self.state = self.OPEN
+                self._opened_at = time.time()
+
+
+class ClientPool(object):
+    """
+    A thread-safe pool of long-lived HTTP clients.
+
+    :param factory: callable taking no arguments and returning a new client
+    :param int size: the most clients that may exist at once
+    :param int idle_timeout: seconds a client may sit unused before its
+                             connections are closed (``0`` to never reap)
+
+    ``httplib2`` keeps connections alive between requests, but an ``Http``
+    object must not be used by two threads at once. Borrowing a client from
+    the pool for the duration of one request lets Sopel's worker threads reuse
+    open connections (and skip DNS lookups and TLS handshakes) safely.
+    """
+    def __init__(self, factory, size=4, idle_timeout=60):
+        self.factory = factory
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (client, last_used) pairs; used as a LIFO stack
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a client from the pool for the duration of a ``with`` block.
+        """
+        client = self.acquire()
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def acquire(self):
+        """
+        Take a client from the pool, creating one if there is room.
+
+        :return: a client created by the pool's ``factory``
+        :raise RuntimeError: if the pool has been closed
+
+        Blocks until a client is released if the pool is already at capacity.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('Twitter client pool is closed')
+                if self._idle:
+                    # most recently used first: its connection is least likely
+                    # to have been dropped by the server
+                    return self._idle.pop()[0]
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self._cond.wait()
+
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, client):
+        """
+        Return a client to the pool.
+
+        :param client: a client previously obtained from :meth:`acquire`
+        """
+        with self._cond:
+            if not self._closed:
+                self._idle.append((client, time.time()))
+                self._cond.notify()
+                return
+        close_connections(client)
+
+    def reap(self):
+        """
+        Close connections on clients that have been idle for too long.
+
+        :return: the number of clients whose connections were closed
+        :rtype: int
+
+        The clients themselves stay in the pool, and will reconnect the next
+        time they are used.
+        """
+        if self.idle_timeout <= 0:
+            return 0
+
+        cutoff = time.time() - self.idle_timeout
+        reaped = 0
+        with self._cond:
+            for client, last_used in self._idle:
+                if last_used < cutoff and client.connections:
+                    close_connections(client)
+                    reaped += 1
+        return reaped
+
+    def close(self):
+        """
+        Close every idle client and refuse further use of the pool.
+
+        Clients still in use are closed as they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for client, _ in idle:
+            close_connections(client)
@@ -0,0 +1,116 @@
+# coding=utf-8
+"""
+Spreading API requests across several sets of app credentials.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import hashlib
+import threading
+import time
+
+from sopel.logger import get_logger
+
+from .client import APIUnavailable
+
+logger = get_logger(__name__)
+
+
+def credential_id(consumer_key):
+    """
+    Get a short, stable name for a consumer key that doesn't reveal it.
+
+    :param str consumer_key: the key
+    :rtype: str
+    """
+    return hashlib.sha256(consumer_key.encode('utf-8')).hexdigest()[:16]
+
+
+class Credential(object):
+    """
+    One app's credentials, and the things kept separately for each app.
+
+    :param str consumer_key: the app's consumer key
+    :param str consumer_secret: the app's consumer secret
+
+    The caller fills in ``clients`` (a :class:`~.client.ClientPool` of clients
+    using these credentials), ``limiter`` (a :class:`~.client.RateLimiter`
+    for the app's budget), and ``tokens`` (a :class:`~.auth.BearerToken`, in
+    app-only mode).
+    """
+    def __init__(self, consumer_key, consumer_secret):
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.id = credential_id(consumer_key)
+        self.clients = None
+        self.limiter = None
+        self.tokens = None
+        self.evicted_until = 0
+
+    def __repr__(self):
+        return '<Credential {}>'.format(self.id)
+
+
+class CredentialPool(object):
+    """
+    Route each request to whichever app has the most budget left for it.
+
+    :param list credentials: the :class:`Credential` objects to choose from
+
+    Apps the API refuses (with a 401 or 429) can be :meth:`evicted <evict>`
+    for a while, and aren't chosen again until then.
+    """
+    def __init__(self, credentials):
+        self.credentials = list(credentials)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return iter(self.credentials)
+
+    def __len__(self):
+        return len(self.credentials)
+
+    def available(self):
+        """
+        Get the credentials that aren't evicted.
+
+        :rtype: list
+        """
+        now = time.time()
+        with self._lock:
+            return [credential for credential in self.credentials
+                    if credential.evicted_until <= now]
+
+    def choose(self, endpoint):
+        """
+        Pick the credentials to make a request with.
+
+        :param str endpoint: the endpoint about to be requested
+        :return: the available credentials with the most requests left for
+                 ``endpoint``; an unknown budget counts as a full one, and
+                 ties go to the one configured first
+        :rtype: :class:`Credential`
+        :raise APIUnavailable: if every app has been evicted
+        """
+        best, most = None, -1
+        for credential in self.available():
+            remaining = credential.limiter.remaining(endpoint)
+            if remaining is None:
+                return credential
+            if remaining > most:
+                best, most = credential, remaining
+        if best is None:
+            raise APIUnavailable('All API credentials are temporarily unavailable')
+        return best
+
+    def evict(self, credential, until):
+        """
+        Stop choosing some credentials for a while.
+
+        :param credential: the credentials to evict
+        :type credential: :class:`Credential`
+        :param float until: the time to start choosing them again
+        """
+        with self._lock:
+            credential.evicted_until = max(credential.evicted_until, until)
+        logger.warning('Not using credentials %s for %d seconds',
+                       credential.id, max(0, until - time.time()))
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""
+JSON decoding backends for sopel-twitter.
+
+Third-party JSON libraries parse API responses several times faster than the
+standard library, and can read the response bytes directly instead of needing
+a decoded copy of the whole body first. Whichever is installed gets used.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import json
+
+
+def _load_orjson():
+    import orjson
+    return orjson.loads
+
+
+def _load_simdjson():
+    import simdjson
+    return simdjson.loads
+
+
+def _load_ujson():
+    import ujson
+    return ujson.loads
+
+
+def _load_json():
+    def loads(content):
+        return json.loads(content.decode('utf-8'))
+    return loads
+
+
+# in order of preference for the "auto" backend
+BACKENDS = (
+    ('orjson', _load_orjson),
+    ('simdjson', _load_simdjson),
+    ('ujson', _load_ujson),
+    ('json', _load_json),
+)
+
+
+def available_backends():
+    """
+    List the JSON backends that can be imported.
+
+    :return: a list of ``(name, loads)`` pairs, most preferred first
+    :rtype: list
+    """
+    backends = []
+    for name, load in BACKENDS:
+        try:
+            backends.append((name, load()))
+        except ImportError:
+            pass
+    return backends
+
+
+def get_decoder(name='auto'):
+    """
+    Get a function that decodes a UTF-8 JSON response body.
+
+    :param str name: a backend name from :data:`BACKENDS`, or ``'auto'`` for
+                     the fastest one available
+    :return: the backend's name and its decoding function, which takes
+             ``bytes``
+    :rtype: tuple
+
+    If the named backend isn't installed, the next one in :data:`BACKENDS`
+    that is gets used instead, so the name returned may differ from
+    ``name``. The standard library's ``json`` is always available.
+    """
+    wanted = name == 'auto'
+    for backend, load in BACKENDS:
+        wanted = wanted or backend == name
+        if wanted:
+            try:
+                return backend, load()
+            except ImportError:
+                pass
+    return 'json', _load_json()
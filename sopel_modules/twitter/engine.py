@@ -0,0 +1,114 @@
+# coding=utf-8
+"""
+Background fetching for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from sopel.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class FetchEngine(object):
+    """
+    A bounded queue of lookups, worked through by background threads.
+
+    :param int workers: how many lookups may run at once
+    :param int queue_size: the most jobs that may wait for a worker
+    :param int deadline: seconds after submission beyond which a job's result
+                         is too stale to deliver
+
+    Sopel's handler threads only need to :meth:`submit` a job and return;
+    the reply is delivered by a worker whenever the lookup finishes.
+    """
+    def __init__(self, workers=4, queue_size=64, deadline=30):
+        self.workers = max(1, workers)
+        self.deadline = deadline
+        self._queue = queue.Queue(queue_size)
+        self._threads = []
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        """Start the worker threads."""
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name='twitter-fetch-{}'.format(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """
+        Stop the worker threads once they finish their current jobs.
+
+        :param int timeout: the most seconds to wait for each worker
+
+        Jobs still waiting in the queue are discarded, though their ``done``
+        callables are still run.
+        """
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            done = job[3]
+            if done is not None:
+                try:
+                    done()
+                except Exception:
+                    logger.exception('Error discarding background Twitter lookup')
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, fetch, deliver, done=None):
+        """
+        Queue a job.
+
+        :param fetch: callable taking no arguments, run by a worker
+        :param deliver: callable taking the result of ``fetch``, run by the
+                        same worker unless the job's deadline has passed
+        :param done: callable taking no arguments, run at the end of the job
+                     no matter what happened to it
+        :return: ``False`` if the queue is full and the job was not accepted
+        :rtype: bool
+        """
+        try:
+            self._queue.put_nowait((time.time() + self.deadline, fetch, deliver, done))
+        except queue.Full:
+            return False
+        return True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            deadline, fetch, deliver, done = job
+            try:
+                if time.time() > deadline:
+                    logger.debug('Dropping job that waited past its deadline')
+                    continue
+                result = fetch()
+                if time.time() > deadline:
+                    logger.debug('Dropping result that arrived past its deadline')
+                    continue
+                deliver(result)
+            except Exception:
+                logger.exception('Error in background Twitter lookup')
+            finally:
+                if done is not None:
+                    done()
@@ -0,0 +1,447 @@
+# coding=utf-8
+"""
+Counters, gauges, and latency histograms for sopel-twitter.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import threading
+from timeit import default_timer as timer
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from sopel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# upper bounds, in seconds, of the latency histograms' buckets; anything
+# slower lands in a last, unbounded one
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def metric_key(name, **labels):
+    """
+    Identify a metric in a :meth:`Metrics.snapshot`.
+
+    :param str name: the metric's name
+    :param labels: the metric's labels
+    :return: ``name`` and a sorted tuple of ``(label, value)`` pairs
+    :rtype: tuple
+    """
+    return name, tuple(sorted(labels.items()))
+
+
+class Histogram(object):
+    """
+    Counts of observed values, by which bucket they fall in.
+
+    :param buckets: the buckets' upper bounds, in ascending order
+    """
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    @property
+    def count(self):
+        """The number of values observed."""
+        return sum(self.counts)
+
+    def observe(self, value):
+        """
+        Count a value.
+
+        :param float value: the value
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile of the observed values.
+
+        :param float q: the quantile, from 0 to 1
+        :return: the upper bound of the bucket the quantile falls in (which
+                 is infinite for the last bucket), or ``None`` if nothing has
+                 been observed
+        :rtype: float
+        """
+        count = self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class _Shard(object):
+    """One thread's counters and histograms."""
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+    def merge(self, counters, histograms):
+        """Add this shard's metrics to some other counters and histograms."""
+        # dict() and list() copies are atomic, so the owning thread can carry on
+        for key, value in dict(self.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, histogram in dict(self.histograms).items():
+            total = histograms.get(key)
+            if total is None:
+                total = histograms[key] = Histogram(histogram.buckets)
+            for i, count in enumerate(list(histogram.counts)):
+                total.counts[i] += count
+            total.sum += histogram.sum
+
+
+class Metrics(object):
+    """
+    A thread-safe collection of named, labelled metrics.
+
+    Each metric is identified by a name and any number of keyword labels,
+    e.g. ``metrics.count('api_responses', endpoint='/users/show', status='200')``.
+    A :meth:`snapshot` gives everything recorded so far.
+
+    Updates take no locks: each thread counts into its own shard, and the
+    shards are only added up when a snapshot is taken. Shards of threads that
+    have finished are folded into a shared total, so Sopel starting a thread
+    per trigger doesn't leave them piling up.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._gauges = {}
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)  # what finished threads counted
+        self._lock = threading.Lock()  # guards _shards and _retired
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = self._local.shard = _Shard(threading.current_thread())
+        with self._lock:
+            self._retire()
+            self._shards.append(shard)
+        return shard
+
+    def _retire(self):
+        # caller must hold the lock
+        live = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                live.append(shard)
+            else:
+                shard.merge(self._retired.counters, self._retired.histograms)
+        self._shards = live
+
+    def count(self, name, amount=1, **labels):
+        """
+        Add to a counter.
+
+        :param str name: the counter
+        :param int amount: how much to add
+        :param labels: the counter's labels
+        """
+        key = metric_key(name, **labels)
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """
+        Set a gauge.
+
+        :param str name: the gauge
+        :param float value: its current value
+        :param labels: the gauge's labels
+        """
+        self._gauges[metric_key(name, **labels)] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Add a value to a histogram.
+
+        :param str name: the histogram
+        :param float value: the value
+        :param labels: the histogram's labels
+        """
+        key = metric_key(name, **labels)
+        histograms = self._shard().histograms
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Time a block of code into a histogram, in seconds.
+
+        :param str name: the histogram
+        :param labels: the histogram's labels
+        """
+        start = timer()
+        try:
+            yield
+        finally:
+            self.observe(name, timer() - start, **labels)
+
+    def snapshot(self):
+        """
+        Get every metric's current value.
+
+        :return: a dict with ``counters``, ``gauges``, and ``histograms``,
+                 each a dict mapping :func:`metric_key` keys to a number or
+                 :class:`Histogram`
+        :rtype: dict
+
+        Updates made while the snapshot is being taken may or may not be
+        included.
+        """
+        counters, histograms = {}, {}
+        with self._lock:
+            self._retire()
+            for shard in [self._retired] + self._shards:
+                shard.merge(counters, histograms)
+        return {
+            'counters': counters,
+            'gauges': dict(self._gauges),
+            'histograms': histograms,
+        }
+
+
+class Exporter(object):
+    """
+    Makes the plugin's metrics available somewhere outside the bot.
+
+    :param collect: callable taking no arguments, returning a
+                    :meth:`Metrics.snapshot` with gauges up to date
+    :param options: settings for exporters that need them; others ignore them
+
+    Exporters that push metrics somewhere override :meth:`export`, which is
+    called every minute. Ones that serve them on request can instead call
+    ``collect`` whenever they're asked.
+    """
+    def __init__(self, collect, **options):
+        self.collect = collect
+
+    def export(self):
+        """Send the current metrics wherever they go."""
+
+    def close(self):
+        """Release anything the exporter holds open."""
+
+
+class LogExporter(Exporter):
+    """Logs a summary of the metrics every time they're exported."""
+    def export(self):
+        for line in summarize(self.collect()):
+            logger.info('%s', line)
+
+
+class _MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        try:
+            content = expose(self.server.collect(), openmetrics).encode('utf-8')
+        except Exception:
+            logger.exception('Error collecting metrics')
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class PrometheusExporter(Exporter):
+    """
+    Serves the metrics over HTTP, for Prometheus (or anything else that reads
+    its text format, or OpenMetrics) to scrape.
+
+    :param collect: see :class:`Exporter`
+    :param str address: the address to listen on
+    :param int port: the port to listen on
+
+    Metrics are collected when they're requested, on a thread of the
+    exporter's own.
+    """
+    def __init__(self, collect, address='127.0.0.1', port=9464, **options):
+        super(PrometheusExporter, self).__init__(collect)
+        self._server = _MetricsServer((address, port), _MetricsHandler)
+        self._server.collect = collect
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='twitter-metrics')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+EXPORTERS = {
+    'log': LogExporter,
+    'prometheus': PrometheusExporter,
+}
+
+OPENMETRICS_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# how each metric is exposed: its type, and a description; any metric not
+# listed here isn't exposed at all
+METRIC_TYPES = {
+    'api_responses': ('counter', 'API responses, by endpoint and HTTP status'),
+    'cache_lookups': ('counter', 'Cache lookups, by cache and result'),
+    'cache_entries': ('gauge', 'Entries in each memory cache'),
+    'cache_hit_ratio': ('gauge', 'Fraction of each cache\'s lookups that were hits'),
+    'queue_depth': ('gauge', 'Lookups waiting in each queue'),
+    'rate_limit_remaining': ('gauge', 'Requests left in the rate-limit window, by app and endpoint'),
+    'stage_seconds': ('histogram', 'Time spent in each stage of answering a link'),
+}
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, '{}'.format(value)
+                         .replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else '{:d}'.format(value)
+
+
+def expose(snapshot, openmetrics=False, prefix='twitter_'):
+    """
+    Write out a snapshot of the metrics in the Prometheus text format.
+
+    :param dict snapshot: from :meth:`Metrics.snapshot`
+    :param bool openmetrics: use the OpenMetrics text format instead
+    :param str prefix: put before each metric's name
+    :rtype: str
+    """
+    families = {}
+    for kind in ('counters', 'gauges', 'histograms'):
+        for (name, labels), value in snapshot[kind].items():
+            if name in METRIC_TYPES:
+                families.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(families):
+        type_, help_ = METRIC_TYPES[name]
+        family = prefix + name
+        # OpenMetrics names the counter family without its _total suffix
+        described = family + ('_total' if type_ == 'counter' and not openmetrics else '')
+        lines.append('# HELP {} {}'.format(described, help_))
+        lines.append('# TYPE {} {}'.format(described, type_))
+        for labels, value in sorted(families[name], key=lambda sample: sample[0]):
+            if type_ == 'counter':
+                lines.append('{}_total{} {}'.format(family, _labels(labels), _number(value)))
+            elif type_ == 'gauge':
+                lines.append('{}{} {}'.format(family, _labels(labels), _number(value)))
+            else:
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                    cumulative += count
+                    lines.append('{}_bucket{} {:d}'.format(
+                        family, _labels(labels + (('le', _number(float(bound))),)), cumulative))
+                lines.append('{}_count{} {:d}'.format(family, _labels(labels), cumulative))
+                lines.append('{}_sum{} {}'.format(family, _labels(labels), _number(value.sum)))
+    if openmetrics:
+        lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+def total(values, name, **labels):
+    """
+    Add up the metrics with a name, and any given labels.
+
+    :param dict values: ``(name, labels)`` keys to numbers, from a snapshot
+    :param str name: the metric's name
+    :param labels: labels the metrics must have
+    :rtype: int
+    """
+    wanted = set(labels.items())
+    return sum(value for (key, pairs), value in values.items()
+               if key == name and wanted.issubset(pairs))
+
+
+def summarize(snapshot):
+    """
+    Describe a snapshot of the metrics in a few lines of text.
+
+    :param dict snapshot: from :meth:`Metrics.snapshot`
+    :return: the lines
+    :rtype: list
+    """
+    stages = []
+    for (name, labels), histogram in sorted(snapshot['histograms'].items()):
+        if name != 'stage_seconds' or not histogram.count:
+            continue
+        stages.append('{} {:,}× {:.2f}/{:g}ms'.format(
+            dict(labels)['stage'], histogram.count,
+            histogram.sum / histogram.count * 1000,
+            histogram.quantile(0.95) * 1000))
+
+    counters = snapshot['counters']
+    caches = []
+    for cache in ('tweets', 'users', 'errors', 'disk'):
+        hits = total(counters, 'cache_lookups', cache=cache, result='hit')
+        stale = total(counters, 'cache_lookups', cache=cache, result='stale')
+        lookups = total(counters, 'cache_lookups', cache=cache)
+        if lookups:
+            caches.append('{} {:.0%} of {:,}'.format(cache, (hits + stale) / lookups, lookups))
+
+    statuses = {}
+    for (name, labels), value in counters.items():
+        if name == 'api_responses':
+            status = dict(labels)['status']
+            statuses[status] = statuses.get(status, 0) + value
+
+    budgets = []
+    for (name, labels), value in sorted(snapshot['gauges'].items()):
+        if name == 'rate_limit_remaining':
+            labels = dict(labels)
+            budgets.append('{} {} {:,}'.format(labels['credential'][:8], labels['endpoint'], value))
+
+    return [
+        'Latency (mean/p95): ' + (', '.join(stages) or 'nothing yet'),
+        'Cache hits: ' + (', '.join(caches) or 'nothing yet'),
+        'API responses: ' + (', '.join('{} {:,}'.format(status, count)
+                                       for status, count in sorted(statuses.items()))
+                             or 'none yet'),
+        'Rate limits left: ' + (', '.join(budgets) or 'unknown'),
+    ]
@@ -0,0 +1,484 @@
+# coding=utf-8
+"""
+Compact representations of the API objects sopel-twitter uses.
+
+Decoded API responses carry far more than we ever output (every entity type,
+the author's full profile, nested retweets, and so on). Pulling out just the
+fields we need, once, keeps cached tweets and users small.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from datetime import datetime, timedelta
+
+try:
+    from datetime import timezone
+    UTC = timezone.utc
+except ImportError:
+    import pytz
+    UTC = pytz.utc
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Status IDs since late 2010 are "Snowflakes", whose top 41 bits are the
+# milliseconds since Twitter's own epoch at which the tweet was posted
+SNOWFLAKE_EPOCH_MS = 1288834974657
+FIRST_SNOWFLAKE = 29700859247125504  # older IDs are just sequence numbers
+
+MONTHS = {month: number for number, month in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+
+class ErrorResult(object):
+    """
+    An error the API returned instead of the requested object.
+
+    :param int code: Twitter's error code, if it gave one
+    :param str message: Twitter's description of the error, if it gave one
+    """
+    __slots__ = ('code', 'message')
+
+    def __init__(self, code=None, message=None):
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return '<ErrorResult {} {!r}>'.format(self.code, self.message)
+
+
+class UrlEntity(object):
+    """
+    A t.co link in some text, and where it really goes.
+    """
+    __slots__ = ('url', 'expanded_url', 'indices')
+
+    def __init__(self, url, expanded_url, indices):
+        self.url = url
+        self.expanded_url = expanded_url
+        self.indices = indices
+
+
+class MediaItem(object):
+    """
+    A piece of media attached to a tweet.
+
+    ``link`` is the output of :func:`get_preferred_media_item_link`, chosen
+    once when the item is extracted.
+    """
+    __slots__ = ('url', 'indices', 'link')
+
+    def __init__(self, url, indices, link):
+        self.url = url
+        self.indices = indices
+        self.link = link
+
+
+class User(object):
+    """
+    A user's profile.
+
+    ``url`` is already expanded, as are any links in ``description``.
+    ``created_at`` is a UTC :class:`~datetime.datetime`, or ``None`` if the
+    API didn't say.
+    """
+    __slots__ = (
+        'id', 'name', 'screen_name', 'verified', 'protected', 'location', 'url',
+        'description', 'friends_count', 'followers_count', 'statuses_count',
+        'favourites_count', 'created_at',
+    )
+
+    def __init__(self, **kwargs):
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs[attr])
+
+    def __repr__(self):
+        return '<User {} @{}>'.format(self.id, self.screen_name)
+
+
+class Tweet(object):
+    """
+    A tweet.
+
+    ``quoted_status_id`` is only set if this tweet quotes another, and
+    ``quoted`` is the quoted :class:`Tweet` if the API included it.
+    ``created_at`` is a UTC :class:`~datetime.datetime`.
+    """
+    __slots__ = (
+        'id', 'text', 'created_at', 'retweet_count', 'favorite_count', 'user',
+        'urls', 'media', 'quoted_status_id', 'quoted',
+    )
+
+    def __init__(self, **kwargs):
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs[attr])
+
+    def __repr__(self):
+        return '<Tweet {} by @{}>'.format(self.id, self.user.screen_name)
+
+
+def get_extended_media(tweet):
+    """
+    Twitter annoyingly only returns extended_entities if certain entities exist.
+    """
+    # Get either the extended entities or an empty dict
+    maybe_entities = tweet.get('extended_entities', {})
+    # Safely return either the media key or an empty list
+    return maybe_entities.get('media', [])
+
+
+def get_preferred_media_item_link(item):
+    """
+    Guess the most useful link for a given piece of embedded media.
+
+    :param item: a single media object, as decoded JSON
+    :return: the best-guess link to output for optimum IRC user utility
+    :rtype: str
+
+    Twitter puts just a thumbnail for the media link if it's animated/video.
+    Ideally we'd like clients that support it to show inline video, not a
+    thumbnail, so we need to apply a little guesswork to figure out if we can
+    output a video clip instead of a static image.
+    """
+    video_info = item.get('video_info', {})
+    variants = video_info.get('variants', [])
+
+    if not (video_info and variants):
+        # static image, or unknown other rich media item; return static image
+        return item['media_url_https']
+
+    # if we've reached this point, it's probably "real" rich media
+    if len(variants) > 1:
+        # ugh, Twitter returns unsorted data
+        variants = sorted(variants, key=lambda k: k.get('bitrate', 0))
+
+    return variants[-1]['url']
+
+
+def get_preferred_media_link_v2(media):
+    """
+    Like :func:`get_preferred_media_item_link`, for a v2 API media object.
+
+    :param dict media: a media object from a v2 response's ``includes``
+    :return: the best-guess link to output
+    :rtype: str
+    """
+    variants = [variant for variant in media.get('variants', [])
+                if variant.get('content_type') == 'video/mp4']
+    if variants:
+        return max(variants, key=lambda k: k.get('bit_rate', 0))['url']
+    return media.get('url') or media.get('preview_image_url')
+
+
+def snowflake_time(id_):
+    """
+    Get the time a tweet was posted from its status ID.
+
+    :param str id_: the status ID
+    :return: the time, to the second (like ``created_at``), or ``None`` if
+             the ID is too old to be a Snowflake
+    :rtype: :class:`~datetime.datetime`
+    """
+    id_ = int(id_)
+    if id_ < FIRST_SNOWFLAKE:
+        return None
+    return datetime.fromtimestamp(((id_ >> 22) + SNOWFLAKE_EPOCH_MS) // 1000, UTC)
+
+
+def parse_created_at(stamp):
+    """
+    Parse a v1.1 API timestamp, like ``Wed Oct 10 20:19:24 +0000 2018``.
+
+    :param str stamp: the timestamp, or ``None``
+    :return: the time, or ``None`` if ``stamp`` was
+    :rtype: :class:`~datetime.datetime`
+    :raise ValueError: if ``stamp`` isn't in that format
+
+    The format never changes, so this picks it apart by position, which
+    takes a fraction of the time :func:`~datetime.datetime.strptime` does.
+    """
+    if stamp is None:
+        return None
+    # the API only ever gives times in UTC
+    if len(stamp) != 30 or stamp[19:26] != ' +0000 ' or stamp[4:7] not in MONTHS:
+        raise ValueError('Unexpected timestamp format: {!r}'.format(stamp))
+    return datetime(int(stamp[26:]), MONTHS[stamp[4:7]], int(stamp[8:10]),
+                    int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19]), tzinfo=UTC)
+
+
+def parse_iso_timestamp(stamp):
+    """
+    Parse a v2 API timestamp, like ``2018-10-10T20:19:24.000Z``.
+
+    :param str stamp: the timestamp, or ``None``
+    :return: the time, or ``None`` if ``stamp`` was
+    :rtype: :class:`~datetime.datetime`
+    :raise ValueError: if ``stamp`` isn't in that format
+    """
+    if stamp is None:
+        return None
+    if len(stamp) != 24 or stamp[19] != '.' or stamp[23] != 'Z':
+        raise ValueError('Unexpected timestamp format: {!r}'.format(stamp))
+    return datetime(int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]),
+                    int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19]),
+                    int(stamp[20:23]) * 1000, tzinfo=UTC)
+
+
+def extract_error(data):
+    """
+    Build an :class:`ErrorResult` from a decoded API error response.
+
+    :param dict data: the decoded response, containing ``errors``
+    :rtype: :class:`ErrorResult`
+    """
+    try:
+        error = data['errors'][0]
+    except (IndexError, KeyError, TypeError):
+        error = {}
+    return ErrorResult(error.get('code'), error.get('message'))
+
+
+def extract_user(data):
+    """
+    Build a :class:`User` from a decoded API user object.
+
+    :param dict data: the decoded user object
+    :rtype: :class:`User`
+    """
+    # without entities (e.g. include_entities=false), links stay as t.co
+    entities = data.get('entities') or {}
+    url = data.get('url', None) or ''
+    if url:
+        urls = entities.get('url', {}).get('urls', [])  # Twitter c'mon, this is absurd
+        if urls:
+            url = urls[0].get('expanded_url') or url
+
+    bio = data.get('description', '') or ''
+    if bio:
+        for link in entities.get('description', {}).get('urls', []):  # bloody t.co everywhere
+            bio = bio.replace(link['url'], link['expanded_url'])
+
+    return User(
+        id=data['id_str'],
+        name=data['name'],
+        screen_name=data['screen_name'],
+        verified=data.get('verified', False),
+        protected=data.get('protected', False),
+        location=data.get('location', '') or '',
+        url=url,
+        description=bio,
+        friends_count=data.get('friends_count', 0),
+        followers_count=data.get('followers_count', 0),
+        statuses_count=data.get('statuses_count', 0),
+        favourites_count=data.get('favourites_count', 0),
+        created_at=parse_created_at(data.get('created_at')),
+    )
+
+
+def extract_tweet(data):
+    """
+    Build a :class:`Tweet` from a decoded API tweet object.
+
+    :param dict data: the decoded tweet object
+    :rtype: :class:`Tweet`
+    """
+    try:
+        text = data['full_text']
+    except KeyError:
+        text = data['text']
+
+    if data.get('is_quote_status'):
+        quoted_status_id = data.get('quoted_status_id_str')
+    else:
+        quoted_status_id = None
+    quoted = data.get('quoted_status')
+
+    return Tweet(
+        id=data['id_str'],
+        text=text,
+        created_at=snowflake_time(data['id_str']) or parse_created_at(data['created_at']),
+        retweet_count=data['retweet_count'],
+        favorite_count=data['favorite_count'],
+        user=extract_user(data['user']),
+        urls=tuple(
+            UrlEntity(url['url'], url['expanded_url'], tuple(url['indices']))
+            for url in data['entities']['urls']),
+        media=tuple(
+            MediaItem(item['url'], tuple(item['indices']), get_preferred_media_item_link(item))
+            for item in get_extended_media(data)),
+        quoted_status_id=quoted_status_id,
+        quoted=extract_tweet(quoted) if quoted_status_id and quoted else None,
+    )
+
+
+def extract_user_v2(data):
+    """
+    Build a :class:`User` from a v2 API user object.
+
+    :param dict data: the decoded user object
+    :rtype: :class:`User`
+
+    Fields that weren't requested are left empty.
+    """
+    entities = data.get('entities', {})
+    if data.get('url', None):
+        url = entities['url']['urls'][0]['expanded_url']
+    else:
+        url = ''
+
+    bio = data.get('description', '') or ''
+    if bio:
+        for link in entities.get('description', {}).get('urls', []):
+            bio = bio.replace(link['url'], link['expanded_url'])
+
+    metrics = data.get('public_metrics', {})
+    return User(
+        id=data['id'],
+        name=data['name'],
+        screen_name=data['username'],
+        verified=data.get('verified', False),
+        protected=data.get('protected', False),
+        location=data.get('location', '') or '',
+        url=url,
+        description=bio,
+        friends_count=metrics.get('following_count', 0),
+        followers_count=metrics.get('followers_count', 0),
+        statuses_count=metrics.get('tweet_count', 0),
+        favourites_count=metrics.get('like_count', 0),
+        created_at=parse_iso_timestamp(data.get('created_at')),
+    )
+
+
+def extract_tweet_v2(data, users, tweets, media):
+    """
+    Build a :class:`Tweet` from a v2 API tweet object.
+
+    :param dict data: the decoded tweet object
+    :param dict users: the response's expanded users, by ID
+    :param dict tweets: the response's expanded tweets, by ID
+    :param dict media: the response's expanded media, by media key
+    :rtype: :class:`Tweet`
+    """
+    # tweets longer than 280 characters are truncated unless we use this
+    note = data.get('note_tweet', data)
+    text = note['text']
+    urls = []
+    media_entity = None
+    for url in note.get('entities', {}).get('urls', []):
+        if 'media_key' in url:
+            media_entity = media_entity or url
+        else:
+            urls.append(UrlEntity(
+                url['url'], url.get('expanded_url', url['url']), (url['start'], url['end'])))
+
+    if media_entity is None:
+        media_url, media_indices = None, None
+    else:
+        media_url, media_indices = media_entity['url'], (media_entity['start'], media_entity['end'])
+
+    quoted_status_id = None
+    for ref in data.get('referenced_tweets', []):
+        if ref['type'] == 'quoted':
+            quoted_status_id = ref['id']
+    quoted = tweets.get(quoted_status_id)
+
+    metrics = data.get('public_metrics', {})
+    return Tweet(
+        id=data['id'],
+        text=text,
+        created_at=snowflake_time(data['id']) or parse_iso_timestamp(data['created_at']),
+        retweet_count=metrics.get('retweet_count', 0),
+        favorite_count=metrics.get('like_count', 0),
+        user=extract_user_v2(users[data['author_id']]),
+        urls=tuple(urls),
+        media=tuple(
+            MediaItem(media_url, media_indices, get_preferred_media_link_v2(media[key]))
+            for key in data.get('attachments', {}).get('media_keys', [])
+            if key in media),
+        quoted_status_id=quoted_status_id,
+        quoted=(extract_tweet_v2(quoted, users, tweets, media)
+                if quoted and quoted.get('author_id') in users else None),
+    )
+
+
+def _dump_time(stamp):
+    return None if stamp is None else int((stamp - EPOCH).total_seconds())
+
+
+def _load_time(seconds):
+    return None if seconds is None else EPOCH + timedelta(seconds=seconds)
+
+
+def dump_user(user):
+    """
+    Flatten a :class:`User` into a list that can be encoded as JSON.
+
+    :param user: the user
+    :type user: :class:`User`
+    :rtype: list
+
+    Fields are stored by position, in ``__slots__`` order, so anything that
+    stores the result must be invalidated if the slots change.
+    """
+    fields = [getattr(user, attr) for attr in User.__slots__]
+    fields[-1] = _dump_time(user.created_at)
+    return fields
+
+
+def load_user(fields):
+    """
+    Rebuild a :class:`User` from the output of :func:`dump_user`.
+
+    :param list fields: the flattened user
+    :rtype: :class:`User`
+    """
+    user = User(**dict(zip(User.__slots__, fields)))
+    user.created_at = _load_time(user.created_at)
+    return user
+
+
+def dump_tweet(tweet):
+    """
+    Flatten a :class:`Tweet` into a list that can be encoded as JSON.
+
+    :param tweet: the tweet
+    :type tweet: :class:`Tweet`
+    :rtype: list
+
+    See :func:`dump_user`.
+    """
+    return [
+        tweet.id,
+        tweet.text,
+        _dump_time(tweet.created_at),
+        tweet.retweet_count,
+        tweet.favorite_count,
+        dump_user(tweet.user),
+        [[url.url, url.expanded_url, url.indices] for url in tweet.urls],
+        [[item.url, item.indices, item.link] for item in tweet.media],
+        tweet.quoted_status_id,
+        dump_tweet(tweet.quoted) if tweet.quoted is not None else None,
+    ]
+
+
+def load_tweet(fields):
+    """
+    Rebuild a :class:`Tweet` from the output of :func:`dump_tweet`.
+
+    :param list fields: the flattened tweet
+    :rtype: :class:`Tweet`
+    """
+    (id_, text, created_at, retweet_count, favorite_count, user, urls, media,
+     quoted_status_id, quoted) = fields
+    return Tweet(
+        id=id_,
+        text=text,
+        created_at=_load_time(created_at),
+        retweet_count=retweet_count,
+        favorite_count=favorite_count,
+        user=load_user(user),
+        urls=tuple(UrlEntity(url, expanded_url, tuple(indices))
+                   for url, expanded_url, indices in urls),
+        media=tuple(MediaItem(url, tuple(indices) if indices else indices, link)
+                    for url, indices, link in media),
+        quoted_status_id=quoted_status_id,
+        quoted=load_tweet(quoted) if quoted is not None else None,
+    )
@@ -0,0 +1,237 @@
+# coding=utf-8
+"""
+Recording API traffic, and playing it back without a network.
+
+A recording is a gzipped file of JSON lines, one per request: what was
+asked for, and the response's status, headers, body, and how long it took.
+It's only ever appended to, so a bot can keep adding to the same one across
+restarts; each run adds another gzip member, which readers take in their
+stride.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import base64
+import gzip
+import io
+import json
+import threading
+import time
+import zlib
+from timeit import default_timer as timer
+
+from sopel.logger import get_logger
+
+logger = get_logger(__name__)
+
+# request headers that are never written to a recording
+SECRET_HEADERS = frozenset(['authorization'])
+
+
+class NotRecorded(Exception):
+    """
+    Raised when replaying a request the recording has no response for.
+
+    :param str method: the request's HTTP method
+    :param str uri: the requested URI
+    """
+    def __init__(self, method, uri):
+        super(NotRecorded, self).__init__('No recorded response for {} {}'.format(method, uri))
+        self.method = method
+        self.uri = uri
+
+
+class Recorder(object):
+    """
+    Appends requests and their responses to a recording.
+
+    :param str path: the recording file; created if it doesn't exist
+
+    Safe to share between threads. Each exchange is flushed as soon as it's
+    written, so a crash loses at most the one being written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'ab')
+        self._lock = threading.Lock()
+
+    def write(self, method, uri, headers, response, content, elapsed):
+        """
+        Record one exchange.
+
+        :param str method: the request's HTTP method
+        :param str uri: the requested URI
+        :param dict headers: the request's headers; credentials are left out
+        :param dict response: the ``httplib2`` response (status and headers)
+        :param bytes content: the response body
+        :param float elapsed: seconds the request took
+        """
+        entry = {
+            'time': time.time(),
+            'method': method,
+            'uri': uri,
+            'request_headers': {name: value for name, value in (headers or {}).items()
+                                if name.lower() not in SECRET_HEADERS},
+            'status': int(response['status']),
+            'headers': {name: value for name, value in response.items() if name != 'status'},
+            'elapsed': elapsed,
+        }
+        try:
+            entry['body'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['body_base64'] = base64.b64encode(content).decode('ascii')
+        line = (json.dumps(entry, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """Finish the recording's current gzip member, and close the file."""
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path):
+    """
+    Read back the exchanges in a recording.
+
+    :param str path: the recording file
+    :return: each exchange's entry, in the order they were recorded
+    :rtype: list
+
+    A recording cut short by a crash is read up to the last whole exchange.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # decompress member by member, so a truncated last one only loses its
+    # unfinished tail
+    text = []
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            text.append(decompressor.decompress(data))
+        except zlib.error as e:
+            logger.warning('Recording %s is damaged; ignoring the rest: %s', path, e)
+            break
+        data = decompressor.unused_data
+    text = b''.join(text)
+
+    entries = []
+    for line in io.BytesIO(text):
+        try:
+            entries.append(json.loads(line.decode('utf-8')))
+        except ValueError:
+            break  # the unfinished last line of a truncated recording
+    return entries
+
+
+class Recording(object):
+    """
+    The responses in a recording, ready to be replayed.
+
+    :param list entries: the recorded exchanges, from :func:`read_recording`
+
+    When the same request was recorded more than once, its responses are
+    replayed in the order they were recorded, starting over after the last.
+    Safe to share between threads.
+    """
+    def __init__(self, entries):
+        self._responses = {}  # (method, uri) -> recorded entries
+        self._next = {}
+        self._lock = threading.Lock()
+        for entry in entries:
+            self._responses.setdefault((entry['method'], entry['uri']), []).append(entry)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a recording from a file.
+
+        :param str path: the recording file
+        :rtype: :class:`Recording`
+        """
+        return cls(read_recording(path))
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._responses.values())
+
+    def respond(self, method, uri):
+        """
+        Get the next recorded response to a request.
+
+        :param str method: the request's HTTP method
+        :param str uri: the requested URI
+        :return: the response (status and headers), the body, and the seconds
+                 the original request took
+        :rtype: tuple
+        :raise NotRecorded: if the request was never recorded
+        """
+        key = (method, uri)
+        entries = self._responses.get(key)
+        if not entries:
+            raise NotRecorded(method, uri)
+        with self._lock:
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % len(entries)
+        entry = entries[index]
+
+        response = dict(entry['headers'])
+        response['status'] = '{:d}'.format(entry['status'])
+        if 'body_base64' in entry:
+            content = base64.b64decode(entry['body_base64'])
+        else:
+            content = entry['body'].encode('utf-8')
+        return response, content, entry['elapsed']
+
+
+class RecordingClient(object):
+    """
+    Wraps an API client, recording every request made through it.
+
+    :param client: an ``httplib2.Http`` (or ``oauth2.Client``)
+    :param recorder: where to record requests
+    :type recorder: :class:`Recorder`
+
+    Requests that fail without a response aren't recorded. Anything other
+    than :meth:`request` is passed through to the wrapped client.
+    """
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def request(self, uri, method='GET', **kwargs):
+        start = timer()
+        response, content = self.client.request(uri, method=method, **kwargs)
+        elapsed = timer() - start
+        try:
+            self.recorder.write(method, uri, kwargs.get('headers'), response, content, elapsed)
+        except Exception as e:
+            logger.warning('Could not record %s %s: %s', method, uri, e)
+        return response, content
+
+
+class ReplayClient(object):
+    """
+    Stands in for an API client, answering from a recording.
+
+    :param recording: the responses to give
+    :type recording: :class:`Recording`
+    :param bool timing: whether to take as long to respond as the original
+                        requests did
+
+    Responses are plain dicts of the status and headers, like the
+    ``httplib2.Response`` they were recorded from.
+    """
+    def __init__(self, recording, timing=False):
+        self.recording = recording
+        self.timing = timing
+        self.connections = {}  # nothing to close, but ClientPool will try
+
+    def request(self, uri, method='GET', **kwargs):
+        response, content, elapsed = self.recording.respond(method, uri)
+        if self.timing:
+            time.sleep(elapsed)
+        return response, content
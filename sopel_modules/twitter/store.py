@@ -0,0 +1,240 @@
+# coding=utf-8
+"""
+Persistent caching for sopel-twitter.
+
+Everything here lives in SQLite files in WAL mode, which any number of
+processes can use at once: several bots on the same host, pointed at the same
+file, share what any one of them fetches, and the API budget they draw from.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import sqlite3
+import threading
+import time
+
+from sopel.logger import get_logger
+
+from .client import RateLimiter
+
+logger = get_logger(__name__)
+
+# bump whenever the stored values' format changes; older files are emptied
+FORMAT_VERSION = 1
+
+
+class DiskCache(object):
+    """
+    A cache of encoded tweets and users in an SQLite file, which outlives the
+    bot process.
+
+    :param str path: the database file
+    :param int ttl: seconds after it was fetched that a stored entry expires
+    :param int max_size: the most bytes the database should take up on disk
+
+    Meant to sit behind the in-memory caches, so a restarted bot doesn't have
+    to fetch everything again. Values are opaque ``bytes``; entries are keyed
+    by a ``kind`` (e.g. ``'status'``) and a key within that kind.
+
+    Errors reading or writing the file are logged, and treated as a miss.
+    Other processes may use the same file at the same time.
+    """
+    def __init__(self, path, ttl=3600, max_size=64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._prepare()
+
+    def _prepare(self):
+        with self._lock, self._db:
+            # only takes effect on a new database, so it has to come first
+            self._db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            # WAL lets readers and the writer work at the same time, and only
+            # needs an fsync at checkpoints with synchronous=NORMAL
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            version = self._db.execute('PRAGMA user_version').fetchone()[0]
+            if version != FORMAT_VERSION:
+                self._db.execute('DROP TABLE IF EXISTS entries')
+                self._db.execute('PRAGMA user_version={:d}'.format(FORMAT_VERSION))
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' kind TEXT NOT NULL,'
+                ' key TEXT NOT NULL,'
+                ' fetched REAL NOT NULL,'
+                ' value BLOB NOT NULL,'
+                ' PRIMARY KEY (kind, key)'
+                ') WITHOUT ROWID')
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS entries_fetched ON entries (fetched)')
+
+    def get(self, kind, key):
+        """
+        Get a stored value.
+
+        :param str kind: the kind of value
+        :param str key: the value's key
+        :return: the value, and how many more seconds it's good for; or
+                 ``None`` if it's missing or expired
+        :rtype: tuple
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT value, fetched FROM entries WHERE kind = ? AND key = ? AND fetched > ?',
+                    (kind, key, now - self.ttl)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Could not read %s %s from the disk cache: %s', kind, key, e)
+            return None
+        if row is None:
+            return None
+        value, fetched = row
+        return bytes(value), fetched + self.ttl - now
+
+    def set(self, kind, key, value, fetched=None):
+        """
+        Store a value, replacing any already stored with the same key.
+
+        :param str kind: the kind of value
+        :param str key: the value's key
+        :param bytes value: the value
+        :param float fetched: when the value was fetched from the API
+                              (defaults to now)
+        """
+        if fetched is None:
+            fetched = time.time()
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO entries (kind, key, fetched, value) VALUES (?, ?, ?, ?)',
+                    (kind, key, fetched, sqlite3.Binary(value)))
+        except sqlite3.Error as e:
+            logger.warning('Could not write %s %s to the disk cache: %s', kind, key, e)
+
+    def size(self):
+        """
+        Get the space the stored entries take up.
+
+        :return: the size in bytes, not counting free pages
+        :rtype: int
+        """
+        with self._lock:
+            page_size = self._db.execute('PRAGMA page_size').fetchone()[0]
+            pages = self._db.execute('PRAGMA page_count').fetchone()[0]
+            free = self._db.execute('PRAGMA freelist_count').fetchone()[0]
+        return (pages - free) * page_size
+
+    def prune(self):
+        """
+        Delete expired entries, then the oldest ones until the database fits
+        within ``max_size``, and give the freed space back to the OS.
+
+        This may take a while on a big database; run it somewhere other than
+        a thread that's answering users.
+        """
+        try:
+            with self._lock, self._db:
+                self._db.execute(
+                    'DELETE FROM entries WHERE fetched <= ?', (time.time() - self.ttl,))
+            while self.size() > self.max_size:
+                with self._lock, self._db:
+                    count = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+                    if not count:
+                        break
+                    # drop the oldest tenth at a time, rather than row by row
+                    self._db.execute(
+                        'DELETE FROM entries WHERE (kind, key) IN ('
+                        ' SELECT kind, key FROM entries ORDER BY fetched LIMIT ?)',
+                        (max(1, count // 10),))
+            with self._lock:
+                # execute() only runs this pragma for one step, freeing one page
+                self._db.executescript('PRAGMA incremental_vacuum;')
+                self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as e:
+            logger.warning('Could not prune the disk cache: %s', e)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    A :class:`~.client.RateLimiter` whose budgets are kept in an SQLite file,
+    so every process using the same file and credentials draws from them.
+
+    :param str path: the database file
+    :param str scope: identifies the credentials the budgets belong to;
+                      processes sharing a file but not credentials don't
+                      share budgets
+    :param int reserve: see :class:`~.client.RateLimiter`
+    :param int max_defer: see :class:`~.client.RateLimiter`
+
+    If the file can't be read or written, requests are let through and left
+    to the API to refuse.
+    """
+    def __init__(self, path, scope, reserve=10, max_defer=5):
+        super(SharedRateLimiter, self).__init__(reserve, max_defer)
+        self.path = path
+        self.scope = scope
+        # autocommit: each statement below is atomic on its own
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            # the file may be shared with a DiskCache, and whichever is opened
+            # first creates it; this only takes effect before any table exists
+            self._db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limits ('
+                ' scope TEXT NOT NULL,'
+                ' endpoint TEXT NOT NULL,'
+                ' remaining INTEGER NOT NULL,'
+                ' reset REAL NOT NULL,'
+                ' PRIMARY KEY (scope, endpoint)'
+                ') WITHOUT ROWID')
+
+    def status(self):
+        try:
+            with self._lock:
+                rows = self._db.execute(
+                    'SELECT endpoint, remaining, reset FROM rate_limits WHERE scope = ?',
+                    (self.scope,)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning('Could not read shared rate limits: %s', e)
+            return {}
+        return {endpoint: (remaining, reset) for endpoint, remaining, reset in rows}
+
+    def _spend(self, endpoint, floor, now):
+        try:
+            with self._lock:
+                spent = self._db.execute(
+                    'UPDATE rate_limits SET remaining = remaining - 1'
+                    ' WHERE scope = ? AND endpoint = ? AND reset > ? AND remaining > ?',
+                    (self.scope, endpoint, now, floor)).rowcount
+                if spent:
+                    return None
+                row = self._db.execute(
+                    'SELECT reset FROM rate_limits WHERE scope = ? AND endpoint = ? AND reset > ?',
+                    (self.scope, endpoint, now)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning('Could not spend shared rate limit for %s: %s', endpoint, e)
+            return None
+        return None if row is None else row[0]
+
+    def _record(self, endpoint, limit):
+        try:
+            with self._lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO rate_limits (scope, endpoint, remaining, reset)'
+                    ' VALUES (?, ?, ?, ?)',
+                    (self.scope, endpoint, limit[0], limit[1]))
+        except sqlite3.Error as e:
+            logger.warning('Could not record shared rate limit for %s: %s', endpoint, e)
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._db.close()
@@ -1,23 +1,155 @@
 # coding=utf-8
 from __future__ import unicode_literals, absolute_import, division, print_function
 
-from datetime import datetime
+import functools
 import json
+import math
+import os
 import re
+import sqlite3
+import time
+from timeit import default_timer as timer
 
+import httplib2
 import oauth2 as oauth
 
 from sopel import module, tools
-from sopel.config.types import StaticSection, ValidatedAttribute, NO_DEFAULT
+from sopel.config import ConfigurationError
+from sopel.config.types import (
+    ChoiceAttribute, FilenameAttribute, ListAttribute, StaticSection, ValidatedAttribute,
+    NO_DEFAULT)
 from sopel.logger import get_logger
 
+from .auth import BearerToken
+from .backends import BACKENDS as API_BACKENDS
+from .batch import Coalescer, Sequencer, SingleFlight
+from .cache import TTLCache, UserCache
+from .client import (
+    APIUnavailable, CircuitBreaker, ClientPool, PRIORITY_HIGH, PRIORITY_LOW,
+    RateLimited, RateLimiter, endpoint_name)
+from .credentials import Credential, CredentialPool
+from .decoders import BACKENDS as JSON_BACKENDS, get_decoder
+from .engine import FetchEngine
+from .metrics import EXPORTERS as METRICS_EXPORTERS, Metrics, metric_key, summarize, total
+from .models import ErrorResult, dump_tweet, dump_user, load_tweet, load_user
+from .replay import NotRecorded, Recorder, Recording, RecordingClient, ReplayClient
+from .store import DiskCache, SharedRateLimiter
+
 logger = get_logger(__name__)
 
+# API error codes whose results are remembered for negative_cache_long_ttl
+# seconds, because retrying won't change the answer any time soon
+NEGATIVE_CACHE_LONG = frozenset([
+    17,   # No user matches for specified terms
+    34,   # Sorry, that page does not exist
+    50,   # User not found
+    63,   # User has been suspended
+    144,  # No status found with that ID
+])
+# API error codes that are never cached, because they say nothing about the
+# requested object; any other code is cached for negative_cache_ttl seconds
+NEGATIVE_CACHE_NEVER = frozenset([
+    32,   # Could not authenticate you
+    88,   # Rate limit exceeded
+    89,   # Invalid or expired token
+    130,  # Over capacity
+    131,  # Internal error
+    215,  # Bad authentication data
+])
+
+# what Twitter allows in a screen name; anything else is never sent to the
+# API, where it could break the query string of a whole batch of lookups
+SCREEN_NAME = re.compile(r'^[A-Za-z0-9_]{1,15}$')
+
+# Output templates, each alongside the request parameters (for each API
+# version) that ask for only what it needs; anything else in a response is
+# decoded just to be thrown away
+STATUS_TEMPLATE = "[Twitter] {tweet} | {RTs} RTs | {hearts} ♥s | Posted: {posted}"
+STATUS_PARAMS = {
+    '1.1': (
+        ('tweet_mode', 'extended'),
+        ('include_my_retweet', 'false'),
+        ('include_ext_alt_text', 'false'),
+        ('include_card_uri', 'false'),
+    ),
+    '2': (
+        ('expansions', 'author_id,attachments.media_keys,referenced_tweets.id,'
+                       'referenced_tweets.id.author_id,referenced_tweets.id.attachments.media_keys'),
+        ('tweet.fields', 'attachments,author_id,created_at,entities,note_tweet,'
+                         'public_metrics,referenced_tweets'),
+        ('user.fields', 'verified'),
+        ('media.fields', 'url,variants'),
+    ),
+}
+USER_TEMPLATE = (
+    '[Twitter] {user.name} (@{user.screen_name}){verified}{protected}{location}{url}'
+    ' | {user.friends_count:,} friends, {user.followers_count:,} followers'
+    ' | {user.statuses_count:,} tweets, {user.favourites_count:,} ♥s'
+    ' | Joined: {joined}{bio}')
+USER_PARAMS = {
+    # include_entities=false would also drop the profile's url/description
+    # entities, which expand its t.co links
+    '1.1': (),
+    '2': (
+        ('user.fields', 'created_at,description,entities,location,protected,'
+                        'public_metrics,url,verified'),
+    ),
+}
+
 
 class TwitterSection(StaticSection):
     consumer_key = ValidatedAttribute('consumer_key', default=NO_DEFAULT)
     consumer_secret = ValidatedAttribute('consumer_secret', default=NO_DEFAULT)
+    # more apps to spread requests across, each given as "key:secret"
+    extra_credentials = ListAttribute('extra_credentials', default=[])
+    credential_cooldown = ValidatedAttribute('credential_cooldown', int, default=300)
     show_quoted_tweets = ValidatedAttribute('show_quoted_tweets', bool, default=True)
+    # the most users one .twitinfo will look up (and say a line about)
+    twitinfo_max_users = ValidatedAttribute('twitinfo_max_users', int, default=5)
+    auth_mode = ChoiceAttribute('auth_mode', ['oauth1', 'app'], default='oauth1')
+    api_version = ChoiceAttribute('api_version', sorted(API_BACKENDS), default='1.1')
+    cache_bearer_token = ValidatedAttribute('cache_bearer_token', bool, default=True)
+    client_pool_size = ValidatedAttribute('client_pool_size', int, default=4)
+    client_idle_timeout = ValidatedAttribute('client_idle_timeout', int, default=60)
+    tweet_cache_size = ValidatedAttribute('tweet_cache_size', int, default=256)
+    tweet_cache_ttl = ValidatedAttribute('tweet_cache_ttl', int, default=300)
+    # seconds past tweet_cache_ttl that a cached tweet may still be shown,
+    # while it's refreshed in the background; 0 to always wait for a refresh
+    tweet_cache_stale_ttl = ValidatedAttribute('tweet_cache_stale_ttl', int, default=0)
+    user_cache_size = ValidatedAttribute('user_cache_size', int, default=256)
+    user_cache_ttl = ValidatedAttribute('user_cache_ttl', int, default=900)
+    negative_cache_size = ValidatedAttribute('negative_cache_size', int, default=512)
+    negative_cache_ttl = ValidatedAttribute('negative_cache_ttl', int, default=60)
+    negative_cache_long_ttl = ValidatedAttribute('negative_cache_long_ttl', int, default=3600)
+    batch_window = ValidatedAttribute('batch_window', float, default=0.05)
+    batch_across_channels = ValidatedAttribute('batch_across_channels', bool, default=False)
+    rate_limit_reserve = ValidatedAttribute('rate_limit_reserve', int, default=10)
+    rate_limit_max_defer = ValidatedAttribute('rate_limit_max_defer', int, default=5)
+    request_timeout = ValidatedAttribute('request_timeout', int, default=10)
+    breaker_threshold = ValidatedAttribute('breaker_threshold', int, default=5)
+    breaker_cooldown = ValidatedAttribute('breaker_cooldown', int, default=30)
+    async_fetch = ValidatedAttribute('async_fetch', bool, default=False)
+    fetch_workers = ValidatedAttribute('fetch_workers', int, default=4)
+    fetch_queue_size = ValidatedAttribute('fetch_queue_size', int, default=64)
+    fetch_deadline = ValidatedAttribute('fetch_deadline', int, default=30)
+    json_backend = ChoiceAttribute(
+        'json_backend', ['auto'] + [name for name, _ in JSON_BACKENDS], default='auto')
+    disk_cache = ValidatedAttribute('disk_cache', bool, default=False)
+    disk_cache_file = FilenameAttribute('disk_cache_file', default=None)
+    disk_cache_ttl = ValidatedAttribute('disk_cache_ttl', int, default=3600)
+    disk_cache_max_size = ValidatedAttribute('disk_cache_max_size', int, default=64)  # MiB
+    shared_rate_limits = ValidatedAttribute('shared_rate_limits', bool, default=False)
+    metrics_exporter = ChoiceAttribute(
+        'metrics_exporter', ['none'] + sorted(METRICS_EXPORTERS), default='none')
+    # where the prometheus exporter serves /metrics
+    metrics_address = ValidatedAttribute('metrics_address', default='127.0.0.1')
+    metrics_port = ValidatedAttribute('metrics_port', int, default=9464)
+    # 'record' saves every API request and response to traffic_file, and
+    # 'replay' answers requests from it instead of the API (e.g. to benchmark
+    # offline), optionally taking as long as the originals did
+    client_mode = ChoiceAttribute('client_mode', ['live', 'record', 'replay'], default='live')
+    traffic_file = FilenameAttribute('traffic_file', default=None)
+    replay_timing = ValidatedAttribute('replay_timing', bool, default=False)
 
 
 def configure(config):
@@ -33,98 +165,632 @@ def configure(config):
 
 def setup(bot):
     bot.config.define_section('twitter', TwitterSection)
+    bot.memory['twitter_metrics'] = Metrics()
+    backend, bot.memory['twitter_json'] = get_decoder(bot.config.twitter.json_backend)
+    if bot.config.twitter.json_backend not in ('auto', backend):
+        logger.warning('JSON backend %s is not installed; using %s instead',
+                       bot.config.twitter.json_backend, backend)
+    version = bot.config.twitter.api_version
+    # how requests are actually authenticated; kept out of the config, which
+    # would otherwise save it over the owner's setting
+    bot.memory['twitter_auth_mode'] = bot.config.twitter.auth_mode
+    if version == '2' and bot.config.twitter.auth_mode != 'app':
+        # signed requests to the v2 lookups are refused with a 401 or 403
+        logger.warning('API version 2 needs auth_mode = app; using app-only authentication')
+        bot.memory['twitter_auth_mode'] = 'app'
+    bot.memory['twitter_backend'] = API_BACKENDS[version](
+        STATUS_PARAMS[version], USER_PARAMS[version])
+    if bot.config.twitter.client_mode == 'replay':
+        try:
+            bot.memory['twitter_recording'] = Recording.load(traffic_path(bot))
+        except (IOError, OSError) as e:
+            # don't quietly make live requests instead
+            raise ConfigurationError(
+                'client_mode is replay, but the recording at {} could not be read: {}'
+                .format(traffic_path(bot), e))
+    elif bot.config.twitter.client_mode == 'record':
+        try:
+            bot.memory['twitter_recorder'] = Recorder(traffic_path(bot))
+        except (IOError, OSError) as e:
+            logger.warning('Could not open %s to record API traffic: %s', traffic_path(bot), e)
+    credentials = [(bot.config.twitter.consumer_key, bot.config.twitter.consumer_secret)]
+    for entry in bot.config.twitter.extra_credentials:
+        key, sep, secret = entry.partition(':')
+        if not (key and sep and secret):
+            logger.warning('Ignoring an extra_credentials entry not in key:secret form')
+        elif key not in (known for known, _ in credentials):
+            credentials.append((key, secret))
+    bot.memory['twitter_credentials'] = CredentialPool(
+        make_credential(bot, key, secret) for key, secret in credentials)
+    bot.memory['twitter_breaker'] = CircuitBreaker(
+        threshold=bot.config.twitter.breaker_threshold,
+        cooldown=bot.config.twitter.breaker_cooldown)
+    bot.memory['twitter_tweets'] = TTLCache(
+        maxsize=bot.config.twitter.tweet_cache_size,
+        ttl=bot.config.twitter.tweet_cache_ttl,
+        stale_ttl=bot.config.twitter.tweet_cache_stale_ttl)
+    bot.memory['twitter_users'] = UserCache(
+        maxsize=bot.config.twitter.user_cache_size,
+        ttl=bot.config.twitter.user_cache_ttl)
+    bot.memory['twitter_errors'] = TTLCache(
+        maxsize=bot.config.twitter.negative_cache_size,
+        ttl=bot.config.twitter.negative_cache_ttl)
+    if bot.config.twitter.disk_cache:
+        path = disk_cache_path(bot)
+        try:
+            bot.memory['twitter_store'] = DiskCache(
+                path,
+                ttl=bot.config.twitter.disk_cache_ttl,
+                max_size=bot.config.twitter.disk_cache_max_size * 1024 * 1024)
+        except sqlite3.Error as e:
+            logger.warning('Could not open the disk cache at %s: %s', path, e)
+    bot.memory['twitter_status_batches'] = Coalescer(
+        lambda ids: fetch_statuses(bot, ids),
+        window=bot.config.twitter.batch_window)
+    bot.memory['twitter_user_batches'] = Coalescer(
+        lambda names: fetch_users(bot, names),
+        window=bot.config.twitter.batch_window)
+    bot.memory['twitter_inflight'] = SingleFlight()
+    # a reply held up longer than this would have been dropped as stale anyway
+    bot.memory['twitter_sequencer'] = Sequencer(timeout=bot.config.twitter.fetch_deadline)
+    if bot.config.twitter.async_fetch:
+        engine = FetchEngine(
+            workers=bot.config.twitter.fetch_workers,
+            queue_size=bot.config.twitter.fetch_queue_size,
+            deadline=bot.config.twitter.fetch_deadline)
+        engine.start()
+        bot.memory['twitter_engine'] = engine
+    exporter = bot.config.twitter.metrics_exporter
+    if exporter != 'none':
+        try:
+            bot.memory['twitter_exporter'] = METRICS_EXPORTERS[exporter](
+                lambda: collect_metrics(bot),
+                address=bot.config.twitter.metrics_address,
+                port=bot.config.twitter.metrics_port)
+        except (IOError, OSError) as e:
+            logger.warning('Could not start the %s metrics exporter: %s', exporter, e)
+
+
+def shutdown(bot):
+    exporter = bot.memory.pop('twitter_exporter', None)
+    if exporter is not None:
+        exporter.close()
+    engine = bot.memory.pop('twitter_engine', None)
+    if engine is not None:
+        engine.stop()
+    for credential in bot.memory.pop('twitter_credentials', []):
+        credential.clients.close()
+        if isinstance(credential.limiter, SharedRateLimiter):
+            credential.limiter.close()
+    recorder = bot.memory.pop('twitter_recorder', None)
+    if recorder is not None:
+        recorder.close()
+    bot.memory.pop('twitter_recording', None)
+    bot.memory.pop('twitter_json', None)
+    bot.memory.pop('twitter_auth_mode', None)
+    bot.memory.pop('twitter_backend', None)
+    bot.memory.pop('twitter_breaker', None)
+    bot.memory.pop('twitter_tweets', None)
+    bot.memory.pop('twitter_users', None)
+    bot.memory.pop('twitter_errors', None)
+    store = bot.memory.pop('twitter_store', None)
+    if store is not None:
+        store.close()
+    bot.memory.pop('twitter_status_batches', None)
+    bot.memory.pop('twitter_user_batches', None)
+    bot.memory.pop('twitter_inflight', None)
+    bot.memory.pop('twitter_sequencer', None)
+    bot.memory.pop('twitter_metrics', None)
+
+
+def timed(stage):
+    """
+    Decorate a function taking the bot as its first argument, to time each
+    call into the ``stage_seconds`` histogram.
+
+    :param str stage: the ``stage`` label to give the timings
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(bot, *args, **kwargs):
+            with bot.memory['twitter_metrics'].timer('stage_seconds', stage=stage):
+                return function(bot, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
-def get_client(bot):
-    """Utility to get an OAuth client. Reduces boilerplate."""
-    return oauth.Client(
-        oauth.Consumer(
-            key=bot.config.twitter.consumer_key,
-            secret=bot.config.twitter.consumer_secret))
+def make_credential(bot, consumer_key, consumer_secret):
+    """
+    Set up the client pool, rate limiter, and so on for one app.
+
+    :param bot: the Sopel instance
+    :param str consumer_key: the app's consumer key
+    :param str consumer_secret: the app's consumer secret
+    :rtype: :class:`~.credentials.Credential`
+    """
+    credential = Credential(consumer_key, consumer_secret)
+    credential.clients = ClientPool(
+        lambda: get_client(bot, credential),
+        size=bot.config.twitter.client_pool_size,
+        idle_timeout=bot.config.twitter.client_idle_timeout)
+    if bot.memory['twitter_auth_mode'] == 'app' and 'twitter_recording' not in bot.memory:
+        # (replayed responses don't need a token)
+        tokens = BearerToken(
+            consumer_key,
+            consumer_secret,
+            timeout=bot.config.twitter.request_timeout)
+        if bot.config.twitter.cache_bearer_token:
+            tokens.load = lambda: load_bearer_token(bot, credential)
+            tokens.save = lambda token: save_bearer_token(bot, credential, token)
+        credential.tokens = tokens
+        try:
+            tokens.get()
+        except APIUnavailable as e:
+            # not fatal; the next request will try again
+            logger.warning('Could not obtain a bearer token for %s: %s', credential.id, e)
+    if bot.config.twitter.shared_rate_limits:
+        try:
+            credential.limiter = SharedRateLimiter(
+                disk_cache_path(bot),
+                rate_limit_scope(bot, credential),
+                reserve=bot.config.twitter.rate_limit_reserve,
+                max_defer=bot.config.twitter.rate_limit_max_defer)
+        except sqlite3.Error as e:
+            logger.warning('Could not open shared rate limits at %s: %s',
+                           disk_cache_path(bot), e)
+    if credential.limiter is None:
+        credential.limiter = RateLimiter(
+            reserve=bot.config.twitter.rate_limit_reserve,
+            max_defer=bot.config.twitter.rate_limit_max_defer)
+    return credential
 
 
-def get_extended_media(tweet):
+def disk_cache_path(bot):
     """
-    Twitter annoyingly only returns extended_entities if certain entities exist.
+    Get the path of the file the disk cache and shared rate limits use.
+
+    Bots on the same host that are configured with the same file share its
+    contents.
     """
-    # Get either the extended entities or an empty dict
-    maybe_entities = tweet.get('extended_entities', {})
-    # Safely return either the media key or an empty list
-    return maybe_entities.get('media', [])
+    return (bot.config.twitter.disk_cache_file or
+            os.path.join(bot.config.core.homedir, 'twitter-cache.db'))
 
 
-def get_preferred_media_item_link(item):
+def rate_limit_scope(bot, credential):
+    """
+    Identify the API budget an app's requests draw from.
+
+    Budgets belong to the app's credentials and how it authenticates, so
+    bots with the same consumer key and auth mode share them. The key is
+    hashed so it isn't left lying around in the file.
     """
-    Guess the most useful link for a given piece of embedded media.
+    return '{}:{}'.format(bot.memory['twitter_auth_mode'], credential.id)
+
+
+def get_client(bot, credential):
+    """Utility to get an API client. Reduces boilerplate."""
+    recording = bot.memory.get('twitter_recording')
+    if recording is not None:
+        return ReplayClient(recording, timing=bot.config.twitter.replay_timing)
+
+    if bot.memory['twitter_auth_mode'] == 'app':
+        # requests carry a bearer token instead of being signed
+        client = httplib2.Http(timeout=bot.config.twitter.request_timeout)
+    else:
+        client = oauth.Client(
+            oauth.Consumer(
+                key=credential.consumer_key,
+                secret=credential.consumer_secret),
+            timeout=bot.config.twitter.request_timeout)
+
+    recorder = bot.memory.get('twitter_recorder')
+    if recorder is not None:
+        return RecordingClient(client, recorder)
+    return client
+
+
+def traffic_path(bot):
+    """Get the path of the file API traffic is recorded to and replayed from."""
+    return (bot.config.twitter.traffic_file or
+            os.path.join(bot.config.core.homedir, 'twitter-traffic.jsonl.gz'))
 
-    :param item: a single media object, as decoded JSON
-    :return: the best-guess link to output for optimum IRC user utility
+
+def bearer_token_name(bot, credential):
+    """Get the name an app's bearer token is saved under."""
+    if credential.consumer_key == bot.config.twitter.consumer_key:
+        return 'bearer_token'
+    return 'bearer_token_' + credential.id
+
+
+def load_bearer_token(bot, credential):
+    """
+    Load the bearer token saved in the bot's database.
+
+    :param bot: the Sopel instance
+    :param credential: the app to load a token for
+    :type credential: :class:`~.credentials.Credential`
+    :return: the saved token, or ``None`` if there isn't one for the app's
+             consumer key
     :rtype: str
+    """
+    saved = bot.db.get_plugin_value('twitter', bearer_token_name(bot, credential))
+    if saved and saved.get('consumer_key') == credential.consumer_key:
+        return saved['token']
+    return None
 
-    Twitter puts just a thumbnail for the media link if it's animated/video.
-    Ideally we'd like clients that support it to show inline video, not a
-    thumbnail, so we need to apply a little guesswork to figure out if we can
-    output a video clip instead of a static image.
+
+def save_bearer_token(bot, credential, token):
     """
-    video_info = item.get('video_info', {})
-    variants = video_info.get('variants', [])
+    Save a bearer token to the bot's database.
 
-    if not (video_info and variants):
-        # static image, or unknown other rich media item; return static image
-        return item['media_url_https']
+    :param bot: the Sopel instance
+    :param credential: the app the token is for
+    :type credential: :class:`~.credentials.Credential`
+    :param str token: the token to save
+    """
+    bot.db.set_plugin_value('twitter', bearer_token_name(bot, credential), {
+        'consumer_key': credential.consumer_key,
+        'token': token,
+    })
 
-    # if we've reached this point, it's probably "real" rich media
-    if len(variants) > 1:
-        # ugh, Twitter returns unsorted data
-        variants.sort(key=lambda k: k.get('bitrate', 0))
 
-    return variants[-1]['url']
+def api_request(bot, url, priority=PRIORITY_LOW):
+    """
+    Make an API request using a client borrowed from the bot's pool.
+
+    :param bot: the Sopel instance
+    :param str url: the full API URL to request
+    :param int priority: whether the request may dip into the rate-limit
+                         budget reserved for explicit commands
+    :return: the ``(response, content)`` pair from ``httplib2``
+    :rtype: tuple
+    :raise RateLimited: if the endpoint's remaining budget doesn't allow
+                        the request, or the API refused it with a 429
+    :raise APIUnavailable: if the request fails, times out, or gets a server
+                           error, or if recent ones have (see
+                           :class:`~.client.CircuitBreaker`)
+
+    With more than one set of credentials, each request uses whichever has
+    the most budget left for the endpoint. If the API refuses them (with a 401
+    or 429), they are set aside for a while and the request is retried with
+    the next best, if there is one.
+    """
+    endpoint = endpoint_name(url)
+    credentials = bot.memory['twitter_credentials']
+    for _ in range(len(credentials)):
+        credential = credentials.choose(endpoint)
+        response, content = send_request(bot, credential, url, endpoint, priority)
+        if len(credentials) == 1:
+            break  # nothing to fall back on; its rate limiter will cope
+        if response['status'] == '401':
+            credentials.evict(credential, time.time() + bot.config.twitter.credential_cooldown)
+        elif response['status'] == '429':
+            credentials.evict(credential, rate_limit_reset(response))
+        else:
+            break
+        if not credentials.available():
+            break
+    if response['status'] == '429':
+        # not an answer about the tweets or users asked for; don't show it
+        raise RateLimited(endpoint, rate_limit_reset(response))
+    return response, content
+
+
+def rate_limit_reset(response):
+    """
+    Get when a rate-limited endpoint can be requested again.
+
+    :param dict response: the ``httplib2`` response to a rate-limited request
+    :return: the ``x-rate-limit-reset`` time, or a minute from now if the
+             response didn't say
+    :rtype: float
+    """
+    try:
+        return int(response['x-rate-limit-reset'])
+    except (KeyError, ValueError):
+        return time.time() + 60
+
+
+def send_request(bot, credential, url, endpoint, priority=PRIORITY_LOW):
+    """
+    Make an API request with a particular app's credentials.
+
+    See :func:`api_request`, which decides which credentials to use.
+    """
+    limiter = credential.limiter
+    breaker = bot.memory['twitter_breaker']
+    tokens = credential.tokens
+    # refuse while the API is down before spending (or waiting for) budget
+    breaker.allow()
+    try:
+        limiter.acquire(endpoint, priority)
+    except RateLimited:
+        breaker.cancel()
+        raise
+    try:
+        with credential.clients.connection() as client:
+            if tokens is None:
+                response, content = client.request(url)
+            else:
+                token = tokens.get()
+                response, content = client.request(
+                    url, headers={'Authorization': 'Bearer ' + token})
+                if response['status'] == '401':
+                    # the token was revoked or expired; get a new one and retry
+                    tokens.invalidate(token)
+                    response, content = client.request(
+                        url, headers={'Authorization': 'Bearer ' + tokens.get()})
+    except NotRecorded as e:
+        # a gap in the recording says nothing about whether the API is up
+        breaker.cancel()
+        bot.memory['twitter_metrics'].count('api_responses', endpoint=endpoint, status='unrecorded')
+        raise APIUnavailable('{}'.format(e))
+    except Exception as e:
+        breaker.record_failure()
+        bot.memory['twitter_metrics'].count('api_responses', endpoint=endpoint, status='error')
+        raise APIUnavailable('{} requesting {}: {}'.format(type(e).__name__, endpoint, e))
+
+    bot.memory['twitter_metrics'].count(
+        'api_responses', endpoint=endpoint, status=response['status'])
+    limiter.update(endpoint, response)
+    if int(response['status']) >= 500:
+        breaker.record_failure()
+        raise APIUnavailable('{} error requesting {}'.format(response['status'], endpoint))
+    breaker.record_success()
+    return response, content
+
+
+def decode_json(bot, content):
+    """
+    Decode an API response body with the configured JSON backend.
+
+    :param bot: the Sopel instance
+    :param bytes content: the response body
+    :return: the decoded JSON
+    """
+    return bot.memory['twitter_json'](content)
+
+
+@module.interval(30)
+def reap_idle_clients(bot):
+    for credential in bot.memory.get('twitter_credentials', []):
+        credential.clients.reap()
+
+
+@module.interval(60)
+def expire_caches(bot):
+    for key in ('twitter_tweets', 'twitter_users', 'twitter_errors'):
+        cache = bot.memory.get(key)
+        if cache is not None:
+            cache.expire()
+
+
+@module.interval(300)
+def prune_disk_cache(bot):
+    store = bot.memory.get('twitter_store')
+    if store is not None:
+        store.prune()
+
+
+@module.interval(60)
+def export_metrics(bot):
+    exporter = bot.memory.get('twitter_exporter')
+    if exporter is not None:
+        exporter.export()
+
+
+def collect_metrics(bot):
+    """
+    Get a snapshot of the plugin's metrics, including its current state.
+
+    :param bot: the Sopel instance
+    :return: a :meth:`~.metrics.Metrics.snapshot`, with gauges added for
+             each known endpoint's remaining rate-limit budget for each app
+             (``rate_limit_remaining``), the size and hit ratio of each cache
+             (``cache_entries`` and ``cache_hit_ratio``), and how many lookups
+             are waiting (``queue_depth``)
+    :rtype: dict
+    """
+    snapshot = bot.memory['twitter_metrics'].snapshot()
+    gauges = snapshot['gauges']
+
+    for cache in ('tweets', 'users', 'errors'):
+        entries = bot.memory.get('twitter_' + cache)
+        if entries is not None:
+            gauges[metric_key('cache_entries', cache=cache)] = len(entries)
+    for cache in ('tweets', 'users', 'errors', 'disk'):
+        lookups = total(snapshot['counters'], 'cache_lookups', cache=cache)
+        if lookups:
+            misses = total(snapshot['counters'], 'cache_lookups', cache=cache, result='miss')
+            gauges[metric_key('cache_hit_ratio', cache=cache)] = 1 - misses / lookups
+
+    for queue, key in (('fetch', 'twitter_engine'),
+                       ('status_batch', 'twitter_status_batches'),
+                       ('user_batch', 'twitter_user_batches'),
+                       ('inflight', 'twitter_inflight')):
+        waiting = bot.memory.get(key)
+        if waiting is not None:
+            gauges[metric_key('queue_depth', queue=queue)] = len(waiting)
+
+    now = time.time()
+    for credential in bot.memory.get('twitter_credentials', []):
+        for endpoint, (remaining, reset) in credential.limiter.status().items():
+            if reset > now:
+                gauges[metric_key(
+                    'rate_limit_remaining', credential=credential.id, endpoint=endpoint)] = remaining
+    return snapshot
+
+
+def count_lookup(bot, cache, result):
+    """
+    Count a cache lookup in the ``cache_lookups`` counters.
+
+    :param bot: the Sopel instance
+    :param str cache: which cache was checked
+    :param str result: ``'hit'``, ``'miss'``, or ``'stale'`` (found, but past
+                       its TTL)
+    """
+    bot.memory['twitter_metrics'].count('cache_lookups', cache=cache, result=result)
+
+
+def check_cache(bot, cache, key):
+    """
+    Look something up in one of the memory caches, counting hits and misses.
+
+    :param bot: the Sopel instance
+    :param str cache: ``'tweets'``, ``'users'``, or ``'errors'``
+    :param key: the cache key
+    :return: the cached value, or ``None``
+    """
+    value = bot.memory['twitter_' + cache].get(key)
+    count_lookup(bot, cache, 'miss' if value is None else 'hit')
+    return value
+
+
+def persist(bot, kind, key, fields):
+    """
+    Save a flattened tweet or user to the disk cache, if it's enabled.
+
+    :param bot: the Sopel instance
+    :param str kind: ``'status'`` or ``'user'``
+    :param str key: the status ID or lowercased screen name
+    :param list fields: the output of :func:`~.models.dump_tweet` or
+                        :func:`~.models.dump_user`
+    """
+    store = bot.memory.get('twitter_store')
+    if store is not None:
+        store.set(kind, key, json.dumps(fields, separators=(',', ':')).encode('utf-8'))
+
+
+def recall(bot, kind, key):
+    """
+    Load a flattened tweet or user from the disk cache, if it's enabled.
+
+    :param bot: the Sopel instance
+    :param str kind: ``'status'`` or ``'user'``
+    :param str key: the status ID or lowercased screen name
+    :return: the flattened object and the seconds it has left to live, or
+             ``None`` if it isn't stored
+    :rtype: tuple
+    """
+    store = bot.memory.get('twitter_store')
+    if store is None:
+        return None
+    found = store.get(kind, key)
+    count_lookup(bot, 'disk', 'miss' if found is None else 'hit')
+    if found is None:
+        return None
+    content, ttl = found
+    return decode_json(bot, content), ttl
+
+
+def cache_error(bot, key, error):
+    """
+    Remember an API error result, according to its error code.
+
+    :param bot: the Sopel instance
+    :param tuple key: the negative cache key, e.g. ``('status', id_)``
+    :param error: the error
+    :type error: :class:`~.models.ErrorResult`
+    """
+    if error.code in NEGATIVE_CACHE_NEVER:
+        return
+    if error.code in NEGATIVE_CACHE_LONG:
+        ttl = bot.config.twitter.negative_cache_long_ttl
+    else:
+        ttl = bot.config.twitter.negative_cache_ttl
+    bot.memory['twitter_errors'].set(key, error, ttl=ttl)
+
+
+def find_entity(text, entity):
+    """
+    Locate an entity's t.co link in a tweet's text.
+
+    :param str text: the tweet's text
+    :param entity: a URL or media entity
+    :type entity: :class:`~.models.UrlEntity` or :class:`~.models.MediaItem`
+    :return: the ``(start, end)`` slice indices of the link, or ``None`` if it
+             isn't in the text
+    :rtype: tuple
+
+    Twitter's ``indices`` count code points in the *unescaped* text, so they
+    drift when the text contains HTML entities (or, on narrow Python 2 builds,
+    astral characters like emoji). If they don't point at the link, search.
+    """
+    if entity.url is None:
+        return None  # v2 doesn't always link media in the text
+    start, end = entity.indices
+    if text[start:end] == entity.url:
+        return start, end
+
+    start = text.find(entity.url)
+    if start == -1:
+        return None
+    return start, start + len(entity.url)
 
 
 def format_tweet(tweet):
     """
     Format a tweet object for display.
 
-    :param tweet: the tweet object, as decoded JSON
-    :return: the formatted tweet, and formatted quoted tweet if it exists
-    :rtype: tuple
+    :param tweet: the tweet
+    :type tweet: :class:`~.models.Tweet`
+    :return: the formatted tweet
+    :rtype: str
     """
-    try:
-        text = tweet['full_text']
-    except KeyError:
-        text = tweet['text']
-    text = text.replace("\n", " \u23CE ")  # Unicode symbol to indicate line-break
-    urls = tweet['entities']['urls']
-    media = get_extended_media(tweet)
-
-    # Remove link to quoted status itself, if it's present
-    if tweet['is_quote_status']:
-        for url in urls:
-            if url['expanded_url'].rsplit('/', 1)[1] == tweet['quoted_status_id_str']:
-                # this regex matches zero-or-more whitespace behind the link, but
-                # whitespace after the link only matches if it's trailing (that is,
-                # not followed by more non-whitespace characters).
-                text = re.sub(r'\s*%s(\s+(?!\S))?' % re.escape(url['url']), '', text)
-                break  # there should only be one
+    text = tweet.text
 
-    # Expand media links so clients with image previews can show them
-    for item in media:
-        url = get_preferred_media_item_link(item)
-        replaced = text.replace(item['url'], url)
-        if replaced == text:
-            # Twitter only puts the first media item's URL in the tweet body
-            # We have to append the others ourselves
-            text += ' ' + url
+    # Collect (start, end, replacement) edits to make to the text, in one pass
+    # at the end. A replacement of None means to remove the link entirely.
+    edits = []
+    appended = []
+
+    # Expand links to full URLs, but remove the link to a quoted status itself
+    for url in tweet.urls:
+        span = find_entity(text, url)
+        if span is None:
+            continue
+        if (tweet.quoted_status_id and
+                url.expanded_url.rsplit('/', 1)[1] == tweet.quoted_status_id):
+            edits.append(span + (None,))
         else:
-            text = replaced
+            edits.append(span + (url.expanded_url,))
+
+    # Expand media links so clients with image previews can show them
+    media_span = None
+    for item in tweet.media:
+        if media_span is None:
+            media_span = find_entity(text, item)
+            if media_span is not None:
+                edits.append(media_span + (item.link,))
+                continue
+        # Twitter only puts the first media item's URL in the tweet body
+        # We have to append the others ourselves
+        appended.append(item.link)
 
-    # Expand other links to full URLs
-    for url in urls:
-        text = text.replace(url['url'], url['expanded_url'])
+    pieces = []
+    pos = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: edit[0]):
+        if start < pos:
+            continue  # overlaps a link we already replaced
+        pieces.append(text[pos:start].replace("\n", " \u23CE "))  # Unicode symbol to indicate line-break
+        if replacement is None:
+            # remove any whitespace behind the link, and whitespace after the
+            # link too if it's trailing (not followed by more text)
+            pieces[-1] = pieces[-1].rstrip()
+            if not text[end:].strip():
+                end = len(text)
+        else:
+            pieces.append(replacement)
+        pos = end
+    pieces.append(text[pos:].replace("\n", " \u23CE "))
+    for url in appended:
+        pieces.append(' ' + url)
+    text = ''.join(pieces)
 
     # Done! At least, until Twitter adds more entity types...
-    u = tweet['user']
-    return u['name'] + ' (@' + u['screen_name'] + '): ' + tools.web.decode(text)
+    u = tweet.user
+    return u.name + ' (@' + u.screen_name + '): ' + tools.web.decode(text)
 
 
 def format_time(bot, trigger, stamp):
@@ -133,141 +799,486 @@ def format_time(bot, trigger, stamp):
 
     :param bot: the Sopel instance from the triggering event
     :param trigger: the trigger itself
-    :param str stamp: the timestamp
+    :param stamp: the timestamp
+    :type stamp: :class:`~datetime.datetime`
     :return: the formatted publish timestamp of the ``tweet``
     :rtype: str
     """
-    parsed = datetime.strptime(stamp, '%a %b %d %H:%M:%S %z %Y')
     tz = tools.time.get_timezone(
         bot.db, bot.config, None, trigger.nick, trigger.sender)
     return tools.time.format_time(
-        bot.db, bot.config, tz, trigger.nick, trigger.sender, parsed)
+        bot.db, bot.config, tz, trigger.nick, trigger.sender, stamp)
 
 
 @module.url(r'https?://(?:m(?:obile)?\.)?twitter\.com/(?P<user>[^/]+)(?:$|/status/(?P<status>\d+)).*')
 @module.url(r'https?://(?:m(?:obile)?\.)?twitter\.com/i/web/status/(?P<status>\d+).*')
+@timed('get_url')
 def get_url(bot, trigger, match):
+    start = timer()
     things = match.groupdict()
     user = things.get('user', None)
     status = things.get('status', None)
 
     if status:
-        output_status(bot, trigger, status)
+        lookup = functools.partial(lookup_status, bot, trigger, status)
+        say = functools.partial(say_status, bot, trigger, status)
     elif user:
-        output_user(bot, trigger, user)
+        lookup = functools.partial(lookup_user, bot, trigger, user)
+        say = functools.partial(say_user, bot, trigger, user)
     else:
         # don't know how to handle this link; silently fail
         # explicit is better than implicit
         return
 
+    # several links in one message are looked up concurrently, but the replies
+    # should still come out in the order the links were posted
+    ticket = bot.memory['twitter_sequencer'].ticket(
+        message_key(trigger), trigger.find(match.group(0)))
+
+    def reply(result):
+        if result is not None:
+            say(result)
+            # the whole wait, whether or not the lookup ran in the background
+            bot.memory['twitter_metrics'].observe('stage_seconds', timer() - start, stage='reply')
+
+    engine = bot.memory.get('twitter_engine')
+    if engine is None:
+        with ticket:
+            result = lookup()
+            if result is not None:
+                ticket.wait()
+            reply(result)
+    # a worker mustn't sit waiting for an earlier link's lookup, which may be
+    # queued behind this one; the reply is left for whoever finishes last
+    elif not engine.submit(lookup, lambda result: ticket.defer(functools.partial(reply, result)),
+                           done=ticket.release):
+        ticket.release()
+        logger.warning('Background lookup queue is full; ignoring %s', match.group(0))
+
 
 @module.commands('twitinfo')
 @module.example('.twitinfo SopelIRC')
+@module.example('.twitinfo SopelIRC dgw')
 def user_command(bot, trigger):
     if not trigger.group(3):
         bot.reply("What user do you want me to look up?")
         return module.NOLIMIT
 
-    output_user(bot, trigger, trigger.group(3))
+    names, invalid = [], []
+    for sn in trigger.group(2).split():
+        if not SCREEN_NAME.match(sn):
+            invalid.append(sn)
+        elif sn.lower() not in (name.lower() for name in names):
+            names.append(sn)
+    if invalid:
+        bot.reply("Not a valid screen name: {}".format(', '.join(invalid)))
+    if not names:
+        return
+    # one line per user; don't let a long list flood the channel
+    limit = max(1, bot.config.twitter.twitinfo_max_users)
+    ignored = len(names) - limit
+    names = names[:limit]
+
+    try:
+        users = get_users(bot, names, PRIORITY_HIGH)
+    except RateLimited as e:
+        minutes = int(math.ceil((e.reset - time.time()) / 60))
+        bot.reply("Twitter's rate limit has been reached. Try again in {} minute{}."
+                  .format(minutes, '' if minutes == 1 else 's'))
+        return
+    except APIUnavailable as e:
+        logger.info('Not looking up screen names %s: %s', ', '.join(names), e)
+        bot.reply("Twitter is unavailable right now. Try again later.")
+        return
+    for sn in names:
+        say_user(bot, trigger, sn, users[sn.lower()])
+    if ignored > 0:
+        bot.reply("I only look up {} user{} at a time; ignored {} more."
+                  .format(limit, '' if limit == 1 else 's', ignored))
+
 
+@module.commands('twitstats')
+@module.require_owner()
+def stats_command(bot, trigger):
+    for line in summarize(collect_metrics(bot)):
+        bot.say(line)
 
-def output_status(bot, trigger, id_):
-    client = get_client(bot)
-    response, content = client.request(
-        'https://api.twitter.com/1.1/statuses/show/{}.json?tweet_mode=extended'.format(id_))
+
+def fetch_statuses(bot, ids):
+    """
+    Fetch several tweets from the API in one request.
+
+    :param bot: the Sopel instance
+    :param list ids: up to 100 status IDs
+    :return: a dict mapping each status ID to its tweet or error
+    :rtype: dict
+    """
+    backend = bot.memory['twitter_backend']
+    response, content = api_request(bot, backend.statuses_url(ids))
     if response['status'] != '200':
-        logger.error('%s error reaching the twitter API for status ID %s',
-                     response['status'], id_)
+        logger.error('%s error reaching the twitter API for status IDs %s',
+                     response['status'], ', '.join(ids))
+
+    return backend.parse_statuses(decode_json(bot, content), ids)
+
+
+def message_key(trigger):
+    """
+    Identify the IRC message a trigger came from.
+
+    :param trigger: the trigger
+    :return: a hashable that is the same for every link in one message
+    :rtype: tuple
+    """
+    return (trigger.sender, trigger.raw)
+
+
+def batch_group(bot, trigger):
+    """
+    Decide which other lookups a trigger's API requests may be batched with.
+
+    :param bot: the Sopel instance
+    :param trigger: the trigger
+    :return: a group key for :class:`~.batch.Coalescer`
+    """
+    if bot.config.twitter.batch_across_channels:
+        return None
+    return message_key(trigger)
+
+
+def get_status(bot, id_, group=None):
+    """
+    Get a tweet from the cache, or from the API if necessary.
+
+    :param bot: the Sopel instance
+    :param str id_: the tweet's status ID
+    :param group: API lookups made at about the same time with the same
+                  ``group`` are combined into a single request
+    :return: the tweet, or the error the API returned
+    :rtype: :class:`~.models.Tweet` or :class:`~.models.ErrorResult`
+    """
+    def fetch():
+        tweet = bot.memory['twitter_status_batches'].get(id_, group)
+        remember_status(bot, id_, tweet)
+        return tweet
+
+    tweet, fresh = bot.memory['twitter_tweets'].lookup(id_)
+    if tweet is None:
+        count_lookup(bot, 'tweets', 'miss')
+    else:
+        count_lookup(bot, 'tweets', 'hit' if fresh else 'stale')
+        if not fresh:
+            # answer now, and get up-to-date counts for next time
+            bot.memory['twitter_inflight'].start(
+                ('status', id_), functools.partial(revalidate_status, bot, id_, fetch))
+        return tweet
+
+    tweet = (check_cache(bot, 'errors', ('status', id_)) or
+             recall_status(bot, id_))
+    if tweet is not None:
+        return tweet
+
+    # other threads may be fetching the same tweet for another channel
+    return bot.memory['twitter_inflight'].do(('status', id_), fetch)
+
+
+def revalidate_status(bot, id_, fetch):
+    """
+    Refresh a stale cached tweet in the background.
+
+    :param bot: the Sopel instance
+    :param str id_: the tweet's status ID
+    :param fetch: callable taking no arguments, that fetches and remembers
+                  the tweet
+    :return: the tweet, or the error the API returned
+    :rtype: :class:`~.models.Tweet` or :class:`~.models.ErrorResult`
+    """
+    try:
+        tweet = fetch()
+    except (RateLimited, APIUnavailable) as e:
+        # keep serving the stale copy until it expires for good
+        logger.info('Not refreshing status ID %s: %s', id_, e)
+        raise
+    except Exception:
+        logger.exception('Error refreshing status ID %s', id_)
+        raise
+    if isinstance(tweet, ErrorResult) and tweet.code not in NEGATIVE_CACHE_NEVER:
+        # e.g. deleted since it was cached; stop serving the stale copy
+        bot.memory['twitter_tweets'].pop(id_)
+    return tweet
+
+
+def remember_status(bot, id_, tweet):
+    """
+    Cache a tweet (or error) freshly fetched from the API.
+
+    :param bot: the Sopel instance
+    :param str id_: the tweet's status ID
+    :param tweet: the tweet or error
+    :type tweet: :class:`~.models.Tweet` or :class:`~.models.ErrorResult`
+    """
+    if isinstance(tweet, ErrorResult):
+        cache_error(bot, ('status', id_), tweet)
+        return
+
+    bot.memory['twitter_tweets'].set(id_, tweet)
+    persist(bot, 'status', id_, dump_tweet(tweet))
+    if not bot.memory['twitter_backend'].full_authors:
+        return
+    # a freshly fetched tweet embeds its author's current profile
+    for status in (tweet, tweet.quoted):
+        if status is not None:
+            bot.memory['twitter_users'].refresh(status.user)
+
+
+def recall_status(bot, id_):
+    """
+    Get a tweet from the disk cache, putting it back in the memory cache.
+
+    :param bot: the Sopel instance
+    :param str id_: the tweet's status ID
+    :return: the tweet, or ``None`` if it isn't stored
+    :rtype: :class:`~.models.Tweet`
+    """
+    recalled = recall(bot, 'status', id_)
+    if recalled is None:
+        return None
+    fields, ttl = recalled
+    tweet = load_tweet(fields)
+    bot.memory['twitter_tweets'].set(id_, tweet, ttl=min(ttl, bot.config.twitter.tweet_cache_ttl))
+    return tweet
 
-    tweet = json.loads(content.decode('utf-8'))
-    if tweet.get('errors', []):
+
+@timed('lookup_status')
+def lookup_status(bot, trigger, id_):
+    """
+    Get a tweet for a trigger, unless the API can't be asked right now.
+
+    :param bot: the Sopel instance
+    :param trigger: the trigger
+    :param str id_: the tweet's status ID
+    :return: the tweet or error, or ``None``
+    :rtype: :class:`~.models.Tweet` or :class:`~.models.ErrorResult`
+    """
+    try:
+        return get_status(bot, id_, batch_group(bot, trigger))
+    except (RateLimited, APIUnavailable) as e:
+        # automatic link expansion can wait; don't bother the channel
+        logger.info('Not looking up status ID %s: %s', id_, e)
+        return None
+
+
+@timed('say_status')
+def say_status(bot, trigger, id_, tweet):
+    if isinstance(tweet, ErrorResult):
         msg = "Twitter returned an error"
-        try:
-            error = tweet['errors'][0]
-        except IndexError:
-            error = {}
-        try:
-            msg = msg + ': ' + error['message']
+        if tweet.message:
+            msg = msg + ': ' + tweet.message
             if msg[-1] != '.':
                 msg = msg + '.'  # some texts end with a period, but not all -___-
-        except KeyError:
+        else:
             msg = msg + '. :( Maybe the tweet was deleted?'
         bot.say(msg)
         logger.debug('Tweet ID {id} returned error code {code}: "{message}"'
-            .format(id=id_, code=error.get('code', '-1'),
-                message=error.get('message', '(unknown description)')))
+            .format(id=id_, code=tweet.code or '-1',
+                message=tweet.message or '(unknown description)'))
         return
 
-    template = "[Twitter] {tweet} | {RTs} RTs | {hearts} ♥s | Posted: {posted}"
+    bot.say(render_status(bot, trigger, tweet))
 
-    bot.say(template.format(tweet=format_tweet(tweet),
-                            RTs=tweet['retweet_count'],
-                            hearts=tweet['favorite_count'],
-                            posted=format_time(bot, trigger, tweet['created_at'])))
+    if tweet.quoted is not None and bot.config.twitter.show_quoted_tweets:
+        bot.say(render_status(bot, trigger, tweet.quoted, 'Quoting: '))
 
-    if tweet['is_quote_status'] and bot.config.twitter.show_quoted_tweets:
-        tweet = tweet['quoted_status']
-        bot.say(template.format(tweet='Quoting: ' + format_tweet(tweet),
-                                RTs=tweet['retweet_count'],
-                                hearts=tweet['favorite_count'],
-                                posted=format_time(bot, trigger, tweet['created_at'])))
+
+def render_status(bot, trigger, tweet, prefix=''):
+    """
+    Fill in the status template for a tweet, timing how long it takes.
+
+    :param bot: the Sopel instance
+    :param trigger: the trigger
+    :param tweet: the tweet
+    :type tweet: :class:`~.models.Tweet`
+    :param str prefix: text to put before the tweet's author
+    :return: the line to send
+    :rtype: str
+    """
+    metrics = bot.memory['twitter_metrics']
+    with metrics.timer('stage_seconds', stage='format_tweet'):
+        text = format_tweet(tweet)
+    with metrics.timer('stage_seconds', stage='format_time'):
+        posted = format_time(bot, trigger, tweet.created_at)
+    return STATUS_TEMPLATE.format(tweet=prefix + text,
+                                  RTs=tweet.retweet_count,
+                                  hearts=tweet.favorite_count,
+                                  posted=posted)
 
 
-def output_user(bot, trigger, sn):
-    client = get_client(bot)
-    response, content = client.request(
-        'https://api.twitter.com/1.1/users/show.json?screen_name={}'.format(sn))
+def fetch_users(bot, names, priority=PRIORITY_LOW):
+    """
+    Fetch several users' profiles from the API in one request.
+
+    :param bot: the Sopel instance
+    :param list names: up to 100 lowercase screen names
+    :param int priority: the request's rate-limit priority
+    :return: a dict mapping each screen name to its user or error
+    :rtype: dict
+    """
+    backend = bot.memory['twitter_backend']
+    response, content = api_request(bot, backend.users_url(names), priority)
     if response['status'] != '200':
-        logger.error('%s error reaching the twitter API for screen name %s',
-                     response['status'], sn)
+        logger.error('%s error reaching the twitter API for screen names %s',
+                     response['status'], ', '.join(names))
+
+    return backend.parse_users(decode_json(bot, content), names)
+
+
+def get_user(bot, sn, group=None):
+    """
+    Get a user's profile from the cache, or from the API if necessary.
+
+    :param bot: the Sopel instance
+    :param str sn: the user's screen name
+    :param group: API lookups made at about the same time with the same
+                  ``group`` are combined into a single request
+    :return: the user, or the error the API returned; or ``None`` if ``sn``
+             isn't a valid screen name
+    :rtype: :class:`~.models.User` or :class:`~.models.ErrorResult`
+    """
+    if not SCREEN_NAME.match(sn):
+        return None
+    sn = sn.lower()
+    user = (check_cache(bot, 'users', sn) or
+            check_cache(bot, 'errors', ('user', sn)))
+    if user is not None:
+        return user
+
+    user = recall_user(bot, sn)
+    if user is not None:
+        return user
+
+    def fetch():
+        user = bot.memory['twitter_user_batches'].get(sn, group)
+        remember_user(bot, sn, user)
+        return user
+
+    # other threads may be fetching the same user for another channel
+    return bot.memory['twitter_inflight'].do(('user', sn), fetch)
+
+
+def get_users(bot, names, priority=PRIORITY_LOW):
+    """
+    Get several users' profiles, fetching any that aren't cached together.
+
+    :param bot: the Sopel instance
+    :param list names: the users' screen names
+    :param int priority: the rate-limit priority of any API requests
+    :return: a dict mapping each lowercased screen name to its user or error;
+             names that aren't valid screen names are left out
+    :rtype: dict
+    """
+    users = {}
+    missing = []
+    for sn in names:
+        if not SCREEN_NAME.match(sn):
+            continue
+        sn = sn.lower()
+        user = (check_cache(bot, 'users', sn) or
+                check_cache(bot, 'errors', ('user', sn)))
+        if user is None:
+            user = recall_user(bot, sn)
+        if user is None:
+            missing.append(sn)
+        else:
+            users[sn] = user
+
+    for i in range(0, len(missing), 100):
+        for sn, user in fetch_users(bot, missing[i:i + 100], priority).items():
+            remember_user(bot, sn, user)
+            users[sn] = user
+    return users
+
+
+def remember_user(bot, sn, user):
+    """
+    Cache a user (or error) freshly fetched from the API.
 
-    user = json.loads(content.decode('utf-8'))
-    if user.get('errors', []):
+    :param bot: the Sopel instance
+    :param str sn: the lowercased screen name that was looked up
+    :param user: the user or error
+    :type user: :class:`~.models.User` or :class:`~.models.ErrorResult`
+    """
+    if isinstance(user, ErrorResult):
+        cache_error(bot, ('user', sn), user)
+    else:
+        bot.memory['twitter_users'].set(user)
+        persist(bot, 'user', sn, dump_user(user))
+
+
+def recall_user(bot, sn):
+    """
+    Get a user from the disk cache, putting them back in the memory cache.
+
+    :param bot: the Sopel instance
+    :param str sn: the lowercased screen name
+    :return: the user, or ``None`` if they aren't stored
+    :rtype: :class:`~.models.User`
+    """
+    recalled = recall(bot, 'user', sn)
+    if recalled is None:
+        return None
+    fields, ttl = recalled
+    user = load_user(fields)
+    bot.memory['twitter_users'].set(user, ttl=min(ttl, bot.config.twitter.user_cache_ttl))
+    return user
+
+
+@timed('lookup_user')
+def lookup_user(bot, trigger, sn):
+    """
+    Get a user's profile for a trigger, unless the API can't be asked right now.
+
+    :param bot: the Sopel instance
+    :param trigger: the trigger
+    :param str sn: the user's screen name
+    :return: the user or error, or ``None`` (also if ``sn`` isn't a valid
+             screen name)
+    :rtype: :class:`~.models.User` or :class:`~.models.ErrorResult`
+    """
+    try:
+        return get_user(bot, sn, batch_group(bot, trigger))
+    except (RateLimited, APIUnavailable) as e:
+        logger.info('Not looking up screen name %s: %s', sn, e)
+        return None
+
+
+@timed('say_user')
+def say_user(bot, trigger, sn, user):
+    if isinstance(user, ErrorResult):
         msg = "Twitter returned an error"
-        try:
-            error = user['errors'][0]
-        except IndexError:
-            error = {}
-        try:
-            msg = msg + ': ' + error['message']
+        if user.message:
+            msg = msg + ': ' + user.message
             if msg[-1] != '.':
                 msg = msg + '.'  # some texts end with a period, but not all... thanks, Twitter
-        except KeyError:
+        else:
             msg = msg + '. :( Maybe that user doesn\'t exist?'
         bot.say(msg)
         logger.debug('Screen name {sn} returned error code {code}: "{message}"'
-            .format(sn=sn, code=error.get('code', '-1'),
-                message=error.get('message', '(unknown description)')))
+            .format(sn=sn, code=user.code or '-1',
+                message=user.message or '(unknown description)'))
         return
 
-    if user.get('url', None):
-        url = user['entities']['url']['urls'][0]['expanded_url']  # Twitter c'mon, this is absurd
-    else:
-        url = ''
+    bio = tools.web.decode(user.description) if user.description else ''
+    with bot.memory['twitter_metrics'].timer('stage_seconds', stage='format_time'):
+        joined = format_time(bot, trigger, user.created_at)
 
-    joined = datetime.strptime(user['created_at'], '%a %b %d %H:%M:%S %z %Y')
-    tz = tools.time.get_timezone(
-        bot.db, bot.config, None, trigger.nick, trigger.sender)
-    joined = tools.time.format_time(
-        bot.db, bot.config, tz, trigger.nick, trigger.sender, joined)
-
-    bio = user.get('description', '')
-    if bio:
-        for link in user['entities']['description']['urls']:  # bloody t.co everywhere
-            bio = bio.replace(link['url'], link['expanded_url'])
-        bio = tools.web.decode(bio)
-
-    message = ('[Twitter] {user[name]} (@{user[screen_name]}){verified}{protected}{location}{url}'
-               ' | {user[friends_count]:,} friends, {user[followers_count]:,} followers'
-               ' | {user[statuses_count]:,} tweets, {user[favourites_count]:,} ♥s'
-               ' | Joined: {joined}{bio}').format(
-               user=user,
-               verified=(' ✔️' if user['verified'] else ''),
-               protected=(' 🔒' if user['protected'] else ''),
-               location=(' | ' + user['location'] if user.get('location', None) else ''),
-               url=(' | ' + url if url else ''),
-               joined=format_time(bot, trigger, user['created_at']),
-               bio=(' | ' + bio if bio else ''))
+    message = USER_TEMPLATE.format(
+        user=user,
+        verified=(' ✔️' if user.verified else ''),
+        protected=(' 🔒' if user.protected else ''),
+        location=(' | ' + user.location if user.location else ''),
+        url=(' | ' + user.url if user.url else ''),
+        joined=joined,
+        bio=(' | ' + bio if bio else ''))
 
     # It's unlikely to happen, but theoretically we *might* need to truncate the message if enough
     # of the field values are ridiculously long. Best to be safe.
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""
+Just enough of Sopel to run the plugin without a network or IRC connection.
+
+Shared by the tests and the benchmarks, so both keep up with new settings.
+"""
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from sopel.config import types
+
+from sopel_modules.twitter import twitter
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeDB(object):
+    """Just enough of Sopel's database for the plugin: nothing is saved."""
+    def get_nick_value(self, *args):
+        return None
+
+    get_channel_value = get_nick_or_channel_value = get_plugin_value = get_nick_value
+
+    def set_plugin_value(self, *args):
+        pass
+
+
+class FakeBot(object):
+    """
+    A Sopel instance with the plugin set up, that remembers what it said.
+
+    :param str homedir: where the plugin may keep files
+    :param settings: ``[twitter]`` settings to use instead of the defaults
+    """
+    def __init__(self, homedir='.', **settings):
+        base = getattr(types, 'BaseValidated', types.ValidatedAttribute)
+        section = Namespace()
+        for name in dir(twitter.TwitterSection):
+            attr = getattr(twitter.TwitterSection, name)
+            if isinstance(attr, base):
+                setattr(section, name, attr.default)
+        section.consumer_key = 'key'
+        section.consumer_secret = 'secret'
+        section.__dict__.update(settings)
+
+        self.config = Namespace(
+            twitter=section,
+            core=Namespace(
+                homedir=homedir,
+                default_timezone='UTC',
+                default_time_format='%Y-%m-%d - %T %Z',
+            ),
+            define_section=lambda *args, **kwargs: None,
+        )
+        self.db = FakeDB()
+        self.memory = {}
+        self.said = []
+        twitter.setup(self)
+
+    def say(self, message, *args):
+        self.said.append(message)
+
+    def reply(self, message, *args):
+        self.say(message, *args)
+
+
+class Trigger(object):
+    def __init__(self, sender='#test', nick='tester', raw='', groups=()):
+        self.sender = sender
+        self.nick = nick
+        self.raw = raw
+        self._groups = groups
+
+    def group(self, n):
+        return self._groups[n] if n < len(self._groups) else None
+
+    def find(self, text):
+        return self.raw.find(text)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import json
+import unittest
+
+from sopel_modules.twitter import auth
+from sopel_modules.twitter.auth import BearerToken
+from sopel_modules.twitter.client import APIUnavailable
+
+
+class FakeHttp(object):
+    """Stands in for httplib2.Http, handing out numbered tokens."""
+    requests = []
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def request(self, uri, method='GET', body=None, headers=None):
+        FakeHttp.requests.append((uri, method, body, headers))
+        return {'status': '200'}, json.dumps({
+            'token_type': 'bearer',
+            'access_token': 'token-{}'.format(len(FakeHttp.requests)),
+        }).encode('utf-8')
+
+
+class TestBearerToken(unittest.TestCase):
+    def setUp(self):
+        FakeHttp.requests = []
+        self.real_http = auth.httplib2.Http
+        auth.httplib2.Http = FakeHttp
+        self.saved = []
+
+    def tearDown(self):
+        auth.httplib2.Http = self.real_http
+
+    def testFetchesAndSaves(self):
+        tokens = BearerToken('key', 'secret', load=lambda: None, save=self.saved.append)
+        self.assertEqual(tokens.get(), 'token-1')
+        self.assertEqual(tokens.get(), 'token-1')
+        self.assertEqual(self.saved, ['token-1'])
+        uri, method, body, headers = FakeHttp.requests[0]
+        self.assertEqual((uri, method, body), (auth.TOKEN_URL, 'POST', 'grant_type=client_credentials'))
+        self.assertEqual(headers['Authorization'], 'Basic a2V5OnNlY3JldA==')
+
+    def testLoadsSavedToken(self):
+        tokens = BearerToken('key', 'secret', load=lambda: 'saved', save=self.saved.append)
+        self.assertEqual(tokens.get(), 'saved')
+        self.assertEqual(FakeHttp.requests, [])
+        self.assertEqual(self.saved, [])
+
+    def testInvalidateFetchesNewToken(self):
+        tokens = BearerToken('key', 'secret', load=lambda: 'saved', save=self.saved.append)
+        tokens.invalidate(tokens.get())
+        # the rejected token isn't loaded again
+        self.assertEqual(tokens.get(), 'token-1')
+        self.assertEqual(self.saved, ['token-1'])
+
+    def testInvalidateIgnoresReplacedToken(self):
+        tokens = BearerToken('key', 'secret')
+        stale = tokens.get()
+        tokens.invalidate(stale)
+        fresh = tokens.get()
+        # another thread, still holding the old token, has it rejected too
+        tokens.invalidate(stale)
+        self.assertEqual(tokens.get(), fresh)
+        self.assertEqual(len(FakeHttp.requests), 2)
+
+    def testRefusedToken(self):
+        class RefusingHttp(FakeHttp):
+            def request(self, *args, **kwargs):
+                return {'status': '403'}, b'{"errors": [{"code": 99}]}'
+
+        auth.httplib2.Http = RefusingHttp
+        self.assertRaises(APIUnavailable, BearerToken('key', 'secret').get)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import unittest
+
+from sopel_modules.twitter.backends import MISSING_STATUS, MISSING_USER, V1Backend, V2Backend
+
+
+class TestV1Backend(unittest.TestCase):
+    def setUp(self):
+        self.backend = V1Backend(status_params=(('tweet_mode', 'extended'),))
+
+    def testParamsComeFirst(self):
+        self.assertEqual(
+            self.backend.statuses_url(['1', '2']),
+            'https://api.twitter.com/1.1/statuses/lookup.json'
+            '?tweet_mode=extended&id=1,2&map=true')
+
+    def testSingleStatusUsesShow(self):
+        self.assertEqual(
+            self.backend.statuses_url(['1']),
+            'https://api.twitter.com/1.1/statuses/show/1.json?tweet_mode=extended')
+
+    def testUsersAreLookedUpTogether(self):
+        self.assertEqual(
+            self.backend.users_url(['a', 'b']),
+            'https://api.twitter.com/1.1/users/lookup.json?screen_name=a,b')
+        self.assertEqual(
+            self.backend.users_url(['a']),
+            'https://api.twitter.com/1.1/users/show.json?screen_name=a')
+
+    def testQueryValuesAreEncoded(self):
+        self.assertEqual(
+            self.backend.users_url(['c#x', 'a&b=1', 'bob']),
+            'https://api.twitter.com/1.1/users/lookup.json?screen_name=c%23x,a%26b%3D1,bob')
+        self.assertEqual(
+            V2Backend().users_url(['c#x', 'bob']),
+            'https://api.twitter.com/2/users/by?usernames=c%23x,bob')
+
+    def testOmittedUsersAreMissing(self):
+        users = self.backend.parse_users(
+            [{'id_str': '1', 'name': 'A', 'screen_name': 'A'}], ['a', 'b'])
+        self.assertEqual(users['a'].screen_name, 'A')
+        self.assertIs(users['b'], MISSING_USER)
+
+    def testNoMatchesAreMissing(self):
+        users = self.backend.parse_users(
+            {'errors': [{'code': 17, 'message': 'No user matches for specified terms.'}]},
+            ['a', 'b'])
+        self.assertEqual(users, {'a': MISSING_USER, 'b': MISSING_USER})
+
+
+class TestV2Backend(unittest.TestCase):
+    def setUp(self):
+        self.backend = V2Backend()
+        self.response = {
+            'data': [{
+                'id': '2',
+                'text': 'Quoting https://t.co/q https://t.co/pic',
+                'created_at': '2018-10-10T20:19:24.000Z',
+                'author_id': '10',
+                'public_metrics': {'retweet_count': 3, 'like_count': 4},
+                'entities': {'urls': [
+                    {'start': 8, 'end': 22, 'url': 'https://t.co/q',
+                     'expanded_url': 'https://twitter.com/a/status/1'},
+                    {'start': 23, 'end': 39, 'url': 'https://t.co/pic',
+                     'expanded_url': 'https://twitter.com/b/status/2/photo/1',
+                     'media_key': '3_1'},
+                ]},
+                'attachments': {'media_keys': ['3_1', '7_2']},
+                'referenced_tweets': [{'type': 'quoted', 'id': '1'}],
+            }],
+            'includes': {
+                'users': [{'id': '10', 'name': 'B', 'username': 'b'},
+                          {'id': '11', 'name': 'A', 'username': 'a'}],
+                'tweets': [{'id': '1', 'text': 'hi', 'author_id': '11',
+                            'created_at': '2018-10-09T20:19:24.000Z'}],
+                'media': [
+                    {'media_key': '3_1', 'type': 'photo', 'url': 'https://pbs.twimg.com/1.jpg'},
+                    {'media_key': '7_2', 'type': 'video', 'variants': [
+                        {'bit_rate': 256000, 'content_type': 'video/mp4', 'url': 'low.mp4'},
+                        {'content_type': 'application/x-mpegURL', 'url': 'pl.m3u8'},
+                        {'bit_rate': 832000, 'content_type': 'video/mp4', 'url': 'high.mp4'},
+                    ]},
+                ],
+            },
+            'errors': [{'value': '5', 'parameter': 'ids', 'resource_type': 'tweet',
+                        'title': 'Not Found Error', 'detail': 'Could not find tweet with ids: [5].',
+                        'type': 'https://api.twitter.com/2/problems/resource-not-found'}],
+        }
+
+    def testParsesSameModelAsV1(self):
+        tweets = self.backend.parse_statuses(self.response, ['2', '5'])
+        tweet = tweets['2']
+        self.assertEqual(tweet.user.screen_name, 'b')
+        self.assertEqual(tweet.favorite_count, 4)
+        self.assertEqual(tweet.created_at.year, 2018)
+        self.assertEqual([url.url for url in tweet.urls], ['https://t.co/q'])
+        self.assertEqual([item.link for item in tweet.media],
+                         ['https://pbs.twimg.com/1.jpg', 'high.mp4'])
+        self.assertEqual(tweet.quoted_status_id, '1')
+        self.assertEqual(tweet.quoted.user.screen_name, 'a')
+        self.assertEqual(tweets['5'].code, MISSING_STATUS.code)
+
+    def testRequestFailureIsNotMissing(self):
+        users = self.backend.parse_users(
+            {'title': 'Too Many Requests', 'detail': 'Too Many Requests', 'status': 429},
+            ['a', 'b'])
+        self.assertEqual(users['a'].code, 88)
+        self.assertNotEqual(users['b'].code, MISSING_USER.code)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import threading
+import time
+import unittest
+
+from sopel_modules.twitter.batch import Coalescer, Sequencer, SingleFlight
+
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def lookup(keys):
+            self.calls.append(keys)
+            return {key: key.upper() for key in keys}
+
+        self.coalescer = Coalescer(lookup, window=0.2, max_size=3)
+
+    def lookupConcurrently(self, keys, group=None):
+        results = {}
+
+        def worker(key):
+            results[key] = self.coalescer.get(key, group)
+
+        threads = [threading.Thread(target=worker, args=(key,)) for key in keys]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def testConcurrentLookupsShareOneRequest(self):
+        results = self.lookupConcurrently(['a', 'b', 'a'])
+        self.assertEqual(results, {'a': 'A', 'b': 'B'})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(self.calls[0]), ['a', 'b'])
+
+    def testBatchesAreLimitedInSize(self):
+        results = self.lookupConcurrently(['a', 'b', 'c', 'd'])
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(len(keys) for keys in self.calls), [1, 3])
+
+    def testErrorsReachEveryCaller(self):
+        def lookup(keys):
+            raise ValueError('nope')
+
+        coalescer = Coalescer(lookup, window=0)
+        self.assertRaises(ValueError, coalescer.get, 'a')
+
+
+class TestSequencer(unittest.TestCase):
+    def testTicketsReleaseInPositionOrder(self):
+        sequencer = Sequencer(timeout=5)
+        output = []
+        second = sequencer.ticket('msg', 20)
+        first = sequencer.ticket('msg', 10)
+
+        def reply(ticket, text):
+            with ticket:
+                ticket.wait()
+                output.append(text)
+
+        thread = threading.Thread(target=reply, args=(second, 'second'))
+        thread.start()
+        reply(first, 'first')
+        thread.join()
+        self.assertEqual(output, ['first', 'second'])
+        self.assertEqual(sequencer._groups, {})
+
+    def testWaitTimesOut(self):
+        sequencer = Sequencer(timeout=0.01)
+        sequencer.ticket('msg', 0)
+        self.assertFalse(sequencer.ticket('msg', 1).wait())
+
+    def testDeferredRepliesKeepOrder(self):
+        sequencer = Sequencer(timeout=5)
+        output = []
+        first = sequencer.ticket('msg', 10)
+        second = sequencer.ticket('msg', 20)
+        third = sequencer.ticket('msg', 30)
+
+        # neither call blocks, though both have to wait their turn
+        third.defer(lambda: output.append('third'))
+        second.defer(lambda: output.append('second'))
+        third.release()  # leaves the deferred reply alone
+        self.assertEqual(output, [])
+
+        first.defer(lambda: output.append('first'))
+        self.assertEqual(output, ['first', 'second', 'third'])
+        self.assertEqual(sequencer._groups, {})
+
+    def testReleasingRunsDeferredReply(self):
+        sequencer = Sequencer(timeout=5)
+        output = []
+        first = sequencer.ticket('msg', 0)
+        sequencer.ticket('msg', 1).defer(lambda: output.append('second'))
+        first.release()
+        self.assertEqual(output, ['second'])
+        self.assertEqual(sequencer._groups, {})
+
+
+class TestSingleFlight(unittest.TestCase):
+    def testConcurrentCallersShareOneCall(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        finish = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            finish.wait(5)
+            return 'tweet'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('a', fetch)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('a', fetch)))
+        follower.start()
+        finish.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ['tweet', 'tweet'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight._calls, {})
+
+    def testStartRunsInBackgroundOnce(self):
+        flight = SingleFlight()
+        finish = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            finish.wait(5)
+            return 'tweet'
+
+        self.assertTrue(flight.start('a', fetch))
+        self.assertFalse(flight.start('a', fetch))
+        finish.set()
+        for _ in range(500):
+            if not flight._calls:
+                break
+            time.sleep(0.01)
+        self.assertEqual(flight._calls, {})
+        self.assertEqual(len(calls), 1)
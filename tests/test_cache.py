@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import unittest
+
+from sopel_modules.twitter.cache import TTLCache, UserCache
+from sopel_modules.twitter.models import extract_user
+
+
+def make_user(id_, screen_name, followers_count=1):
+    return extract_user({'id_str': id_, 'screen_name': screen_name, 'name': screen_name,
+                         'followers_count': followers_count})
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TTLCache(maxsize=2, ttl=60)
+
+    def testEvictsLeastRecentlyUsed(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def testExpiredEntriesAreMisses(self):
+        self.cache.set('a', 1, ttl=60)
+        self.cache.set('b', 2, ttl=-1)  # never stored
+        self.assertIsNone(self.cache.get('b'))
+        self.cache._data['a'] = (0, 1)  # force expiry
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+    def testStaleEntriesAreOnlyLookedUp(self):
+        cache = TTLCache(maxsize=2, ttl=60, stale_ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.lookup('a'), (1, True))
+        expires, value = cache._data['a']
+        cache._data['a'] = (expires - 90, value)  # 30s into the stale period
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.lookup('a'), (1, False))
+        cache._data['a'] = (0, value)  # past the stale period too
+        self.assertEqual(cache.lookup('a'), (None, False))
+
+    def testDisabledCacheStoresNothing(self):
+        cache = TTLCache(maxsize=0, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(len(cache), 0)
+
+
+class TestUserCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = UserCache(maxsize=2, ttl=60)
+        self.user = make_user('1', 'SopelIRC')
+
+    def testCaseInsensitiveLookup(self):
+        self.cache.set(self.user)
+        self.assertIs(self.cache.get('sopelirc'), self.user)
+        self.assertIs(self.cache.get('SOPELIRC'), self.user)
+        self.assertIs(self.cache.get_by_id('1'), self.user)
+
+    def testRenamedUserReplacesOldEntry(self):
+        self.cache.set(self.user)
+        renamed = make_user('1', 'Sopel')
+        self.cache.set(renamed)
+        self.assertIsNone(self.cache.get('SopelIRC'))
+        self.assertIs(self.cache.get_by_id('1'), renamed)
+        self.assertEqual(len(self.cache), 1)
+
+    def testRefreshOnlyReplacesCachedUsers(self):
+        newer = make_user('1', 'SopelIRC', followers_count=2)
+        self.assertFalse(self.cache.refresh(newer))
+        self.assertIsNone(self.cache.get('SopelIRC'))
+        self.cache.set(self.user)
+        self.assertTrue(self.cache.refresh(newer))
+        self.assertIs(self.cache.get('SopelIRC'), newer)
+
+    def testEvictionDropsIdIndex(self):
+        self.cache.set(self.user)
+        self.cache.set(make_user('2', 'a'))
+        self.cache.set(make_user('3', 'b'))
+        self.assertIsNone(self.cache.get_by_id('1'))
+        self.assertNotIn('1', self.cache._ids)
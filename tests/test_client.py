@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import time
+import unittest
+
+from sopel_modules.twitter.client import (
+    CircuitBreaker, CircuitOpen, ClientPool, PRIORITY_HIGH, PRIORITY_LOW, RateLimited,
+    RateLimiter, endpoint_name)
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.connections = {'https:api.twitter.com': FakeConnection()}
+
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ClientPool(FakeClient, size=2, idle_timeout=60)
+
+    def testReusesReleasedClient(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+
+    def testReapClosesIdleConnections(self):
+        with self.pool.connection() as client:
+            conn = client.connections['https:api.twitter.com']
+        self.assertEqual(self.pool.reap(), 0)
+        self.pool.idle_timeout = -1
+        self.assertEqual(self.pool.reap(), 0)  # non-positive timeout disables reaping
+        self.pool._idle = [(client, 0)]
+        self.pool.idle_timeout = 60
+        self.assertEqual(self.pool.reap(), 1)
+        self.assertTrue(conn.closed)
+        self.assertEqual(client.connections, {})
+
+    def testClosedPoolRefusesClients(self):
+        self.pool.close()
+        self.assertRaises(RuntimeError, self.pool.acquire)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(reserve=2, max_defer=0)
+        self.limiter.update('/statuses/show/:id', {
+            'status': '200',
+            'x-rate-limit-remaining': '3',
+            'x-rate-limit-reset': str(int(time.time()) + 600),
+        })
+
+    def testLowPriorityKeepsReserve(self):
+        self.limiter.acquire('/statuses/show/:id', PRIORITY_LOW)
+        self.assertRaises(RateLimited, self.limiter.acquire,
+                          '/statuses/show/:id', PRIORITY_LOW)
+        self.limiter.acquire('/statuses/show/:id', PRIORITY_HIGH)
+        self.limiter.acquire('/statuses/show/:id', PRIORITY_HIGH)
+        self.assertRaises(RateLimited, self.limiter.acquire,
+                          '/statuses/show/:id', PRIORITY_HIGH)
+
+    def testUnknownEndpointsAreAllowed(self):
+        self.limiter.acquire('/users/show', PRIORITY_LOW)
+
+    def testEndpointNames(self):
+        self.assertEqual(
+            endpoint_name('https://api.twitter.com/1.1/statuses/show/123.json?tweet_mode=extended'),
+            '/statuses/show/:id')
+        self.assertEqual(
+            endpoint_name('https://api.twitter.com/1.1/users/lookup.json?screen_name=a,b'),
+            '/users/lookup')
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=2, cooldown=60)
+
+    def testOpensAfterConsecutiveFailures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertRaises(CircuitOpen, self.breaker.allow)
+
+    def testHalfOpenAllowsOneProbe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at = 0  # cooldown elapsed
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertRaises(CircuitOpen, self.breaker.allow)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.breaker._opened_at = 0
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def testCancelledProbeIsNotWasted(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker._opened_at = 0
+        self.breaker.allow()
+        self.breaker.cancel()
+        self.breaker.allow()  # the next request is the probe instead
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
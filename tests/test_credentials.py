@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import time
+import unittest
+
+from sopel_modules.twitter.client import APIUnavailable, RateLimiter
+from sopel_modules.twitter.credentials import Credential, CredentialPool
+
+
+def make_credential(key, remaining=None):
+    credential = Credential(key, 'secret')
+    credential.limiter = RateLimiter()
+    if remaining is not None:
+        credential.limiter.update('/statuses/show/:id', {
+            'status': '200',
+            'x-rate-limit-remaining': str(remaining),
+            'x-rate-limit-reset': str(int(time.time()) + 600),
+        })
+    return credential
+
+
+class TestCredentialPool(unittest.TestCase):
+    def testChoosesMostRemaining(self):
+        low, high = make_credential('a', 10), make_credential('b', 800)
+        pool = CredentialPool([low, high])
+        self.assertIs(pool.choose('/statuses/show/:id'), high)
+
+    def testUnknownBudgetCountsAsFull(self):
+        known, unknown = make_credential('a', 800), make_credential('b')
+        pool = CredentialPool([known, unknown])
+        self.assertIs(pool.choose('/statuses/show/:id'), unknown)
+
+    def testSkipsEvicted(self):
+        evicted, other = make_credential('a', 800), make_credential('b', 10)
+        pool = CredentialPool([evicted, other])
+        pool.evict(evicted, time.time() + 60)
+        self.assertIs(pool.choose('/statuses/show/:id'), other)
+        pool.evict(other, time.time() + 60)
+        with self.assertRaises(APIUnavailable):
+            pool.choose('/statuses/show/:id')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import unittest
+
+from sopel_modules.twitter import decoders
+from sopel_modules.twitter.decoders import available_backends, get_decoder
+
+
+def missing():
+    raise ImportError('not installed')
+
+
+class TestGetDecoder(unittest.TestCase):
+    def setUp(self):
+        self.real_backends = decoders.BACKENDS
+        decoders.BACKENDS = (
+            ('fastest', missing),
+            ('faster', lambda: 'faster loads'),
+            ('fast', lambda: 'fast loads'),
+            ('absent', missing),
+            ('json', decoders._load_json),
+        )
+
+    def tearDown(self):
+        decoders.BACKENDS = self.real_backends
+
+    def testAutoPicksFirstAvailable(self):
+        self.assertEqual(get_decoder(), ('faster', 'faster loads'))
+
+    def testNamedBackend(self):
+        self.assertEqual(get_decoder('fast'), ('fast', 'fast loads'))
+
+    def testFallsBackToNextAvailable(self):
+        self.assertEqual(get_decoder('fastest'), ('faster', 'faster loads'))
+        self.assertEqual(get_decoder('absent')[0], 'json')
+
+
+class TestDecoders(unittest.TestCase):
+    def testDecodeBytes(self):
+        content = '{"text": "café ☃", "id": 1050118621198921728}'.encode('utf-8')
+        for name, loads in available_backends():
+            self.assertEqual(loads(content), {'text': 'café ☃', 'id': 1050118621198921728},
+                             name)
+
+
+if __name__ == '__main__':
+    unittest.main()
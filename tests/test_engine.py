@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import threading
+import unittest
+
+from sopel_modules.twitter.engine import FetchEngine
+
+
+class TestFetchEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = FetchEngine(workers=1, queue_size=1, deadline=30)
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def testDeliversResults(self):
+        delivered = []
+        finished = threading.Event()
+        self.engine.start()
+        self.assertTrue(self.engine.submit(lambda: 'tweet', delivered.append, finished.set))
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(delivered, ['tweet'])
+
+    def testDropsStaleResults(self):
+        delivered = []
+        finished = threading.Event()
+        self.engine.deadline = -1
+        self.engine.start()
+        self.engine.submit(lambda: 'tweet', delivered.append, finished.set)
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(delivered, [])
+
+    def testRejectsJobsWhenFull(self):
+        self.assertTrue(self.engine.submit(lambda: None, lambda result: None))
+        self.assertFalse(self.engine.submit(lambda: None, lambda result: None))
+
+    def testFinishesDiscardedJobs(self):
+        finished = []
+        self.engine.submit(lambda: None, lambda result: None, lambda: finished.append(1))
+        self.engine.stop()
+        self.assertEqual(finished, [1])
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import threading
+import unittest
+
+try:
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import Request, urlopen
+
+from sopel_modules.twitter.metrics import (
+    Histogram, Metrics, PrometheusExporter, expose, metric_key, summarize, total)
+
+
+class TestHistogram(unittest.TestCase):
+    def testBucketsValues(self):
+        histogram = Histogram((1, 2, 5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.sum, 16)
+
+    def testQuantiles(self):
+        histogram = Histogram((1, 2, 5))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 0.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 1)
+        self.assertEqual(histogram.quantile(0.75), 2)
+        self.assertEqual(histogram.quantile(1), 5)
+        histogram.observe(10)
+        self.assertEqual(histogram.quantile(1), float('inf'))
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(1, 2))
+
+    def testSnapshot(self):
+        self.metrics.count('api_responses', endpoint='/users/show', status='200')
+        self.metrics.count('api_responses', 2, status='200', endpoint='/users/show')
+        self.metrics.set('queue', 3)
+        with self.metrics.timer('stage_seconds', stage='format_tweet'):
+            pass
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {
+            metric_key('api_responses', endpoint='/users/show', status='200'): 3})
+        self.assertEqual(snapshot['gauges'], {('queue', ()): 3})
+        histogram = snapshot['histograms'][metric_key('stage_seconds', stage='format_tweet')]
+        self.assertEqual(histogram.counts, [1, 0, 0])
+
+        # later updates don't change an earlier snapshot
+        self.metrics.observe('stage_seconds', 1.5, stage='format_tweet')
+        self.assertEqual(histogram.count, 1)
+
+    def testAddsUpThreads(self):
+        def work():
+            for _ in range(100):
+                self.metrics.count('api_responses', status='200')
+                self.metrics.observe('stage_seconds', 0.5, stage='reply')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        work()
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {metric_key('api_responses', status='200'): 500})
+        histogram = snapshot['histograms'][metric_key('stage_seconds', stage='reply')]
+        self.assertEqual(histogram.counts, [500, 0, 0])
+        self.assertEqual(histogram.sum, 250)
+        # the finished threads' shards were folded into one
+        self.assertEqual(len(self.metrics._shards), 1)
+
+    def testTotalAndSummary(self):
+        for cache, result in (('tweets', 'hit'), ('tweets', 'stale'), ('tweets', 'miss'),
+                              ('disk', 'miss')):
+            self.metrics.count('cache_lookups', cache=cache, result=result)
+        counters = self.metrics.snapshot()['counters']
+        self.assertEqual(total(counters, 'cache_lookups'), 4)
+        self.assertEqual(total(counters, 'cache_lookups', cache='tweets'), 3)
+        self.assertEqual(total(counters, 'cache_lookups', result='miss'), 2)
+
+        lines = summarize(self.metrics.snapshot())
+        self.assertEqual(lines[0], 'Latency (mean/p95): nothing yet')
+        self.assertEqual(lines[1], 'Cache hits: tweets 67% of 3, disk 0% of 1')
+
+
+class TestExposition(unittest.TestCase):
+    def setUp(self):
+        metrics = Metrics(buckets=(0.5, 1))
+        metrics.count('api_responses', 3, endpoint='/users/show', status='200')
+        metrics.set('queue_depth', 2, queue='fetch')
+        metrics.observe('stage_seconds', 0.75, stage='reply')
+        metrics.count('not_exposed')
+        self.snapshot = metrics.snapshot()
+
+    def testPrometheusText(self):
+        self.assertEqual(expose(self.snapshot).splitlines(), [
+            '# HELP twitter_api_responses_total API responses, by endpoint and HTTP status',
+            '# TYPE twitter_api_responses_total counter',
+            'twitter_api_responses_total{endpoint="/users/show",status="200"} 3',
+            '# HELP twitter_queue_depth Lookups waiting in each queue',
+            '# TYPE twitter_queue_depth gauge',
+            'twitter_queue_depth{queue="fetch"} 2',
+            '# HELP twitter_stage_seconds Time spent in each stage of answering a link',
+            '# TYPE twitter_stage_seconds histogram',
+            'twitter_stage_seconds_bucket{stage="reply",le="0.5"} 0',
+            'twitter_stage_seconds_bucket{stage="reply",le="1.0"} 1',
+            'twitter_stage_seconds_bucket{stage="reply",le="+Inf"} 1',
+            'twitter_stage_seconds_count{stage="reply"} 1',
+            'twitter_stage_seconds_sum{stage="reply"} 0.75',
+        ])
+
+    def testOpenMetrics(self):
+        lines = expose(self.snapshot, openmetrics=True).splitlines()
+        self.assertEqual(lines[1], '# TYPE twitter_api_responses counter')
+        self.assertEqual(lines[-1], '# EOF')
+
+    def testEscapesLabels(self):
+        snapshot = {'counters': {metric_key('api_responses', status='a"b\\c\nd'): 1},
+                    'gauges': {}, 'histograms': {}}
+        self.assertIn('twitter_api_responses_total{status="a\\"b\\\\c\\nd"} 1',
+                      expose(snapshot))
+
+    def testServes(self):
+        exporter = PrometheusExporter(lambda: self.snapshot, port=0)
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(exporter._server.server_address[1])
+            response = urlopen(Request(url, headers={'Accept': 'application/openmetrics-text'}))
+            self.assertTrue(response.headers['Content-Type'].startswith(
+                'application/openmetrics-text'))
+            self.assertEqual(response.read().decode('utf-8'),
+                             expose(self.snapshot, openmetrics=True))
+        finally:
+            exporter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
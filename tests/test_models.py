@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+from datetime import datetime
+import json
+import unittest
+
+from sopel_modules.twitter.models import (
+    UTC, dump_tweet, dump_user, extract_tweet, extract_user, load_tweet, load_user,
+    parse_created_at, parse_iso_timestamp, snowflake_time)
+
+
+class TestDump(unittest.TestCase):
+    def testTweetRoundTrip(self):
+        user = {'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC',
+                'created_at': 'Tue Feb 20 14:35:54 +0000 2007'}
+        quoted = {
+            'id_str': '2', 'full_text': 'hi', 'created_at': 'Wed Oct 10 20:19:24 +0000 2018',
+            'retweet_count': 1, 'favorite_count': 2, 'user': user, 'entities': {'urls': []},
+        }
+        tweet = dict(quoted, id_str='3', full_text='https://t.co/a', is_quote_status=True,
+                     quoted_status_id_str='2', quoted_status=quoted)
+        tweet['entities'] = {'urls': [
+            {'url': 'https://t.co/a', 'expanded_url': 'https://example.com/', 'indices': [0, 14]}]}
+        tweet = extract_tweet(tweet)
+
+        loaded = load_tweet(json.loads(json.dumps(dump_tweet(tweet))))
+        self.assertEqual(dump_tweet(loaded), dump_tweet(tweet))
+        self.assertEqual(loaded.created_at, tweet.created_at)
+        self.assertEqual(loaded.urls[0].indices, (0, 14))
+        self.assertEqual(loaded.quoted.user.created_at, tweet.quoted.user.created_at)
+
+    def testUserWithoutCreatedAt(self):
+        user = extract_user({'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC'})
+        self.assertIsNone(load_user(dump_user(user)).created_at)
+
+    def testUserWithoutEntities(self):
+        user = extract_user({'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC',
+                             'url': 'https://t.co/a', 'description': 'See https://t.co/b'})
+        self.assertEqual(user.url, 'https://t.co/a')
+        self.assertEqual(user.description, 'See https://t.co/b')
+
+    def testUserEntitiesAreExpanded(self):
+        user = extract_user({
+            'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC',
+            'url': 'https://t.co/a', 'description': 'See https://t.co/b',
+            'entities': {
+                'url': {'urls': [{'url': 'https://t.co/a', 'expanded_url': 'https://sopel.chat'}]},
+                'description': {'urls': [
+                    {'url': 'https://t.co/b', 'expanded_url': 'https://github.com/sopel-irc'}]},
+            },
+        })
+        self.assertEqual(user.url, 'https://sopel.chat')
+        self.assertEqual(user.description, 'See https://github.com/sopel-irc')
+
+
+class TestTimestamps(unittest.TestCase):
+    def testParsesCreatedAt(self):
+        self.assertEqual(parse_created_at('Wed Oct 10 20:19:24 +0000 2018'),
+                         datetime(2018, 10, 10, 20, 19, 24, tzinfo=UTC))
+        self.assertIsNone(parse_created_at(None))
+        with self.assertRaises(ValueError):
+            parse_created_at('Wed Oct 10 20:19:24 +0100 2018')
+        with self.assertRaises(ValueError):
+            parse_created_at('2018-10-10T20:19:24.000Z')
+
+    def testParsesIsoTimestamp(self):
+        self.assertEqual(parse_iso_timestamp('2018-10-10T20:19:24.211Z'),
+                         datetime(2018, 10, 10, 20, 19, 24, 211000, tzinfo=UTC))
+        with self.assertRaises(ValueError):
+            parse_iso_timestamp('2018-10-10T20:19:24Z')
+
+    def testSnowflakeTime(self):
+        self.assertEqual(snowflake_time('1050118621198921728'),
+                         parse_created_at('Wed Oct 10 20:19:24 +0000 2018'))
+        self.assertIsNone(snowflake_time('20'))
+
+    def testOldTweetsUseCreatedAt(self):
+        tweet = extract_tweet({
+            'id_str': '20', 'full_text': 'just setting up my twttr',
+            'created_at': 'Tue Mar 21 20:50:14 +0000 2006',
+            'retweet_count': 0, 'favorite_count': 0, 'entities': {'urls': []},
+            'user': {'id_str': '12', 'name': 'jack', 'screen_name': 'jack'},
+        })
+        self.assertEqual(tweet.created_at, datetime(2006, 3, 21, 20, 50, 14, tzinfo=UTC))
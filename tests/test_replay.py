@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sopel_modules.twitter.replay import (
+    NotRecorded, Recorder, Recording, RecordingClient, ReplayClient, read_recording)
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.connections = {}
+        self.calls = 0
+
+    def request(self, uri, method='GET', **kwargs):
+        self.calls += 1
+        return ({'status': '200', 'x-rate-limit-remaining': '899'},
+                '{{"call": {}}}'.format(self.calls).encode('utf-8'))
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'traffic.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, *uris):
+        recorder = Recorder(self.path)
+        client = RecordingClient(FakeClient(), recorder)
+        for uri in uris:
+            client.request(uri, headers={'Authorization': 'Bearer secret', 'Accept': '*/*'})
+        recorder.close()
+
+    def testRecordsWithoutCredentials(self):
+        self.record('https://api.example/a')
+        self.record('https://api.example/b')  # appended as a second gzip member
+        entries = read_recording(self.path)
+        self.assertEqual([entry['uri'] for entry in entries],
+                         ['https://api.example/a', 'https://api.example/b'])
+        self.assertEqual(entries[0]['request_headers'], {'Accept': '*/*'})
+        self.assertEqual(entries[0]['headers'], {'x-rate-limit-remaining': '899'})
+
+    def testReplaysInOrder(self):
+        self.record('https://api.example/a', 'https://api.example/a', 'https://api.example/b')
+        client = ReplayClient(Recording.load(self.path))
+        bodies = [client.request('https://api.example/a')[1] for _ in range(3)]
+        self.assertEqual(bodies, [b'{"call": 1}', b'{"call": 2}', b'{"call": 1}'])
+        response, content = client.request('https://api.example/b')
+        self.assertEqual(response, {'status': '200', 'x-rate-limit-remaining': '899'})
+        self.assertEqual(content, b'{"call": 3}')
+        with self.assertRaises(NotRecorded):
+            client.request('https://api.example/c')
+
+    def testReadsTruncatedRecording(self):
+        self.record('https://api.example/a', 'https://api.example/b')
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-40])  # lose the gzip trailer and some of the last line
+        self.assertEqual([entry['uri'] for entry in read_recording(self.path)],
+                         ['https://api.example/a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
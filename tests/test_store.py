@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+from __future__ import unicode_literals, absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sopel_modules.twitter.client import RateLimited
+from sopel_modules.twitter.store import DiskCache, SharedRateLimiter
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.db')
+        self.cache = DiskCache(self.path, ttl=60, max_size=64 * 1024)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def testSurvivesReopening(self):
+        self.cache.set('status', '1', b'tweet')
+        self.cache.close()
+        self.cache = DiskCache(self.path, ttl=60)
+        value, ttl = self.cache.get('status', '1')
+        self.assertEqual(value, b'tweet')
+        self.assertTrue(0 < ttl <= 60)
+
+    def testKindsAreSeparate(self):
+        self.cache.set('status', '1', b'tweet')
+        self.assertIsNone(self.cache.get('user', '1'))
+
+    def testExpiredEntriesAreMisses(self):
+        self.cache.set('status', '1', b'tweet', fetched=time.time() - 61)
+        self.assertIsNone(self.cache.get('status', '1'))
+
+    def testPruneShrinksToMaxSize(self):
+        now = time.time()
+        for i in range(1000):
+            self.cache.set('status', str(i), b'x' * 200, fetched=now - i * 0.01)
+        self.cache.prune()
+        self.assertLessEqual(self.cache.size(), 64 * 1024)
+        self.assertIsNotNone(self.cache.get('status', '0'))
+        self.assertIsNone(self.cache.get('status', '999'))
+
+
+class TestSharedRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, 'cache.db')
+        self.first = SharedRateLimiter(path, 'app:abc', reserve=0, max_defer=0)
+        self.second = SharedRateLimiter(path, 'app:abc', reserve=0, max_defer=0)
+        self.other = SharedRateLimiter(path, 'app:def', reserve=0, max_defer=0)
+
+    def tearDown(self):
+        for limiter in (self.first, self.second, self.other):
+            limiter.close()
+        shutil.rmtree(self.dir)
+
+    def testBudgetIsShared(self):
+        self.first.update('/statuses/show/:id', {
+            'status': '200',
+            'x-rate-limit-remaining': '1',
+            'x-rate-limit-reset': str(int(time.time()) + 600),
+        })
+        self.second.acquire('/statuses/show/:id')
+        with self.assertRaises(RateLimited):
+            self.first.acquire('/statuses/show/:id')
+        self.other.acquire('/statuses/show/:id')
+
+    def testSharedFileCanBeVacuumed(self):
+        # setup makes the credentials' limiters before it opens the disk cache
+        path = os.path.join(self.dir, 'shared.db')
+        limiter = SharedRateLimiter(path, 'app:abc')
+        cache = DiskCache(path)
+        try:
+            self.assertEqual(cache._db.execute('PRAGMA auto_vacuum').fetchone()[0], 2)
+        finally:
+            cache.close()
+            limiter.close()
@@ -2,9 +2,72 @@
 # coding=utf-8
 from __future__ import unicode_literals, absolute_import, division, print_function
 
+from contextlib import contextmanager
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
 import unittest
 
+try:
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from urlparse import parse_qs, urlparse
+
+from sopel.config import ConfigurationError
+
 from sopel_modules.twitter import twitter
+from sopel_modules.twitter.auth import BearerToken
+from sopel_modules.twitter.client import APIUnavailable, ClientPool, RateLimited
+from sopel_modules.twitter.models import ErrorResult, extract_tweet
+from sopel_modules.twitter.replay import Recorder
+
+from tests.fakes import FakeBot, Trigger
+
+
+@contextmanager
+def patched(name, value):
+    """Replace one of the plugin's functions for the duration of a test."""
+    real = getattr(twitter, name)
+    setattr(twitter, name, value)
+    try:
+        yield
+    finally:
+        setattr(twitter, name, real)
+
+
+def unreachable(*args):
+    raise AssertionError('the API should not have been asked')
+
+
+def make_user(sn):
+    return {'id_str': 'id-' + sn.lower(), 'name': sn, 'screen_name': sn,
+            'created_at': 'Tue Feb 20 14:35:54 +0000 2007'}
+
+
+def make_tweet(id_, text):
+    return {'id_str': id_, 'full_text': text, 'entities': {'urls': []},
+            'created_at': 'Wed Oct 10 20:19:24 +0000 2018',
+            'retweet_count': 0, 'favorite_count': 0,
+            'user': {'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC'}}
+
+
+class FakeAPI(object):
+    """Stands in for api_request, answering users/lookup for some users."""
+    def __init__(self, users=()):
+        self.users = {sn.lower(): make_user(sn) for sn in users}
+        self.urls = []
+
+    def __call__(self, bot, url, priority=twitter.PRIORITY_LOW):
+        self.urls.append(url)
+        names = parse_qs(urlparse(url).query)['screen_name'][0].split(',')
+        found = [self.users[sn] for sn in names if sn in self.users]
+        if len(names) == 1:
+            found = found[0] if found else {'errors': [{'code': 50, 'message': 'User not found.'}]}
+        return {'status': '200'}, json.dumps(found).encode('utf-8')
 
 class TestTwitter(unittest.TestCase):
     def setUp(self):
@@ -12,3 +75,453 @@ class TestTwitter(unittest.TestCase):
 
     def testSomething(self):
         pass
+
+
+class TestFormatTweet(unittest.TestCase):
+    def setUp(self):
+        self.tweet = {
+            'full_text': 'Fish &amp; chips\nhttps://t.co/aaa https://t.co/quote https://t.co/pic',
+            'entities': {'urls': [
+                {'url': 'https://t.co/aaa', 'expanded_url': 'https://example.com/',
+                 'indices': [13, 29]},
+                {'url': 'https://t.co/quote',
+                 'expanded_url': 'https://twitter.com/SopelIRC/status/123',
+                 'indices': [30, 48]},
+            ]},
+            'extended_entities': {'media': [
+                {'url': 'https://t.co/pic', 'indices': [49, 65],
+                 'media_url_https': 'https://pbs.twimg.com/media/1.jpg'},
+                {'url': 'https://t.co/pic', 'indices': [49, 65],
+                 'media_url_https': 'https://pbs.twimg.com/media/2.jpg'},
+            ]},
+            'is_quote_status': True,
+            'quoted_status_id_str': '123',
+            'id_str': '1050118621198921728',
+            'created_at': 'Wed Oct 10 20:19:24 +0000 2018',
+            'retweet_count': 0,
+            'favorite_count': 0,
+            'user': {'id_str': '1', 'name': 'Sopel', 'screen_name': 'SopelIRC'},
+        }
+
+    def testRewritesEntities(self):
+        self.assertEqual(
+            twitter.format_tweet(extract_tweet(self.tweet)),
+            'Sopel (@SopelIRC): Fish & chips ⏎ https://example.com/ '
+            'https://pbs.twimg.com/media/1.jpg https://pbs.twimg.com/media/2.jpg')
+
+    def testRemovesTrailingQuoteLink(self):
+        self.tweet['full_text'] = 'Look at this https://t.co/quote '
+        self.tweet['entities']['urls'][1]['indices'] = [13, 31]
+        del self.tweet['extended_entities']
+        self.assertEqual(twitter.format_tweet(extract_tweet(self.tweet)),
+                         'Sopel (@SopelIRC): Look at this')
+
+
+class FakeTokens(object):
+    def __init__(self, *args, **kwargs):
+        self.load = self.save = None
+
+    def get(self):
+        return 'token'
+
+
+class TestSetup(unittest.TestCase):
+    def testVersion2UsesAppAuth(self):
+        with patched('BearerToken', FakeTokens):
+            bot = FakeBot(api_version='2', auth_mode='oauth1')
+        try:
+            self.assertEqual(bot.memory['twitter_auth_mode'], 'app')
+            # the owner's setting isn't overwritten
+            self.assertEqual(bot.config.twitter.auth_mode, 'oauth1')
+            for credential in bot.memory['twitter_credentials']:
+                self.assertIsInstance(credential.tokens, FakeTokens)
+                self.assertTrue(twitter.rate_limit_scope(bot, credential).startswith('app:'))
+        finally:
+            twitter.shutdown(bot)
+
+
+class TestStageTimings(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def testLookupAndReplyAreTimed(self):
+        error = ErrorResult(144, 'No status found with that ID.')
+        with patched('get_status', lambda bot, id_, group=None: error):
+            tweet = twitter.lookup_status(self.bot, Trigger(), '1')
+        twitter.say_status(self.bot, Trigger(), '1', tweet)
+        self.assertEqual(self.bot.said, ['Twitter returned an error: No status found with that ID.'])
+        histograms = self.bot.memory['twitter_metrics'].snapshot()['histograms']
+        stages = set(dict(labels)['stage'] for name, labels in histograms)
+        self.assertEqual(stages, {'lookup_status', 'say_status'})
+
+
+class TestNegativeCache(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot(negative_cache_ttl=60, negative_cache_long_ttl=3600)
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def ttl(self, key):
+        expires, _ = self.bot.memory['twitter_errors']._data[key]
+        return expires - time.time()
+
+    def testLongTTLForMissingObjects(self):
+        for code in (144, 50, 63):
+            twitter.cache_error(self.bot, ('status', str(code)), ErrorResult(code, 'Gone'))
+            self.assertGreater(self.ttl(('status', str(code))), 3000)
+
+    def testShortTTLForOtherErrors(self):
+        twitter.cache_error(self.bot, ('status', '1'), ErrorResult(179, 'Not authorized'))
+        self.assertLessEqual(self.ttl(('status', '1')), 60)
+
+    def testNeverCachesTransientErrors(self):
+        for code in (88, 130, 215):
+            twitter.cache_error(self.bot, ('status', str(code)), ErrorResult(code, 'Try again'))
+        self.assertEqual(len(self.bot.memory['twitter_errors']), 0)
+
+    def testCachedErrorsAreSaidAgain(self):
+        self.bot.memory['twitter_status_batches'].lookup = unreachable
+        self.bot.memory['twitter_user_batches'].lookup = unreachable
+        twitter.cache_error(self.bot, ('status', '1'),
+                            ErrorResult(144, 'No status found with that ID.'))
+        twitter.cache_error(self.bot, ('user', 'gone'), ErrorResult(50, 'User not found'))
+
+        trigger = Trigger()
+        for _ in range(2):
+            twitter.say_status(self.bot, trigger, '1', twitter.lookup_status(self.bot, trigger, '1'))
+            twitter.say_user(self.bot, trigger, 'Gone', twitter.lookup_user(self.bot, trigger, 'Gone'))
+        self.assertEqual(self.bot.said, [
+            'Twitter returned an error: No status found with that ID.',
+            'Twitter returned an error: User not found.',
+        ] * 2)
+
+
+class TestTwitinfo(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot(twitinfo_max_users=3)
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def twitinfo(self, names):
+        twitter.user_command(self.bot, Trigger(groups=(None, None, names, names.split()[0])))
+
+    def testLooksUpUsersTogether(self):
+        api = FakeAPI(['a', 'B'])
+        with patched('api_request', api):
+            self.twitinfo('a b nobody A')
+        self.assertEqual(len(api.urls), 1)
+        self.assertIn('users/lookup', api.urls[0])
+        self.assertEqual(len(self.bot.said), 3)
+        self.assertTrue(self.bot.said[0].startswith('[Twitter] a (@a)'))
+        self.assertTrue(self.bot.said[1].startswith('[Twitter] B (@B)'))
+        self.assertEqual(self.bot.said[2], 'Twitter returned an error: User not found.')
+
+    def testCapsUsersPerCommand(self):
+        api = FakeAPI(['a', 'b', 'c', 'd', 'e'])
+        with patched('api_request', api):
+            self.twitinfo('a b c d e')
+        self.assertEqual(parse_qs(urlparse(api.urls[0]).query)['screen_name'], ['a,b,c'])
+        self.assertEqual(len(self.bot.said), 4)
+        self.assertEqual(self.bot.said[-1], 'I only look up 3 users at a time; ignored 2 more.')
+
+    def testMalformedNameStaysOutOfBatch(self):
+        api = FakeAPI(['alice', 'bob'])
+        with patched('api_request', api):
+            self.twitinfo('c#x alice bob')
+        self.assertEqual(len(api.urls), 1)
+        self.assertEqual(parse_qs(urlparse(api.urls[0]).query)['screen_name'], ['alice,bob'])
+        self.assertEqual(self.bot.said[0], 'Not a valid screen name: c#x')
+        self.assertTrue(self.bot.said[1].startswith('[Twitter] alice (@alice)'))
+        self.assertTrue(self.bot.said[2].startswith('[Twitter] bob (@bob)'))
+        self.assertEqual(len(self.bot.memory['twitter_errors']), 0)
+
+    def testMalformedProfileLinkIsIgnored(self):
+        with patched('api_request', unreachable):
+            self.assertIsNone(twitter.lookup_user(self.bot, Trigger(), 'alice#x'))
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.bot = FakeBot(disk_cache=True, disk_cache_file=os.path.join(self.dir, 'cache.db'))
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+        shutil.rmtree(self.dir)
+
+    def testTweetOutlivesMemoryCache(self):
+        link = 'https://twitter.com/SopelIRC/status/1050118621198921728'
+        match = re.match(r'https://twitter\.com/(?P<user>\w+)/status/(?P<status>\d+)', link)
+        content = json.dumps(make_tweet('1050118621198921728', 'Hello')).encode('utf-8')
+        with patched('api_request', lambda *args: ({'status': '200'}, content)):
+            twitter.get_url(self.bot, Trigger(raw=link), match)
+
+        self.bot.memory['twitter_tweets'].clear()
+        with patched('api_request', unreachable):
+            twitter.get_url(self.bot, Trigger(raw=link), match)
+        self.assertEqual(len(self.bot.said), 2)
+        self.assertEqual(self.bot.said[0], self.bot.said[1])
+        self.assertIn('Hello', self.bot.said[1])
+
+    def testUserOutlivesMemoryCache(self):
+        trigger = Trigger(groups=(None, None, 'Alice', 'Alice'))
+        with patched('api_request', FakeAPI(['Alice'])):
+            twitter.user_command(self.bot, trigger)
+
+        self.bot.memory['twitter_users'].clear()
+        with patched('api_request', unreachable):
+            twitter.user_command(self.bot, trigger)
+        self.assertEqual(len(self.bot.said), 2)
+        self.assertEqual(self.bot.said[0], self.bot.said[1])
+        self.assertTrue(self.bot.said[1].startswith('[Twitter] Alice (@Alice)'))
+
+
+class TestStaleTweets(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot(tweet_cache_ttl=300, tweet_cache_stale_ttl=600)
+        cache = self.bot.memory['twitter_tweets']
+        cache.set('1', extract_tweet(make_tweet('1', 'Old')))
+        # fetched longer than tweet_cache_ttl ago, but within the stale window
+        cache._data['1'] = (time.time() + 300, cache._data['1'][1])
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def testStaleHitIsServedThenRefreshed(self):
+        requests = []
+        release = threading.Event()
+        content = json.dumps(make_tweet('1', 'New')).encode('utf-8')
+
+        def api_request(bot, url, priority=twitter.PRIORITY_LOW):
+            requests.append(url)
+            release.wait(5)
+            return {'status': '200'}, content
+
+        with patched('api_request', api_request):
+            # answered straight away, while the refresh is held up
+            self.assertEqual(twitter.get_status(self.bot, '1').text, 'Old')
+            self.assertEqual(twitter.get_status(self.bot, '1').text, 'Old')
+            release.set()
+            deadline = time.time() + 5
+            while len(self.bot.memory['twitter_inflight']) and time.time() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(len(requests), 1)
+        tweet, fresh = self.bot.memory['twitter_tweets'].lookup('1')
+        self.assertTrue(fresh)
+        self.assertEqual(tweet.text, 'New')
+
+
+class TestReplay(unittest.TestCase):
+    url = 'https://api.twitter.com/1.1/users/show.json?screen_name=a'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'traffic.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testMissingRecordingIsConfigurationError(self):
+        self.assertRaises(ConfigurationError, FakeBot,
+                          client_mode='replay', traffic_file=self.path)
+
+    def testUnrecordedRequestsDoNotOpenBreaker(self):
+        recorder = Recorder(self.path)
+        recorder.write('GET', self.url, {}, {'status': '200'}, b'{}', 0.01)
+        recorder.close()
+        bot = FakeBot(client_mode='replay', traffic_file=self.path)
+        try:
+            credential = list(bot.memory['twitter_credentials'])[0]
+            breaker = bot.memory['twitter_breaker']
+            for i in range(breaker.threshold + 1):
+                self.assertRaises(APIUnavailable, twitter.send_request, bot, credential,
+                                  self.url + str(i), '/users/show')
+            self.assertEqual(breaker.state, breaker.CLOSED)
+            response, content = twitter.send_request(bot, credential, self.url, '/users/show')
+            self.assertEqual(content, b'{}')
+        finally:
+            twitter.shutdown(bot)
+
+
+class TestRateLimited(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.response = ({'status': '429', 'x-rate-limit-reset': str(int(time.time()) + 590)},
+                         b'{"errors": [{"code": 88, "message": "Rate limit exceeded"}]}')
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def testLinksAreSkippedQuietly(self):
+        with patched('send_request', lambda *args: self.response):
+            self.assertIsNone(twitter.lookup_status(self.bot, Trigger(), '1'))
+        self.assertEqual(len(self.bot.memory['twitter_errors']), 0)
+
+    def testTwitinfoSaysWhenToRetry(self):
+        with patched('send_request', lambda *args: self.response):
+            twitter.user_command(self.bot, Trigger(groups=(None, None, 'a', 'a')))
+        self.assertEqual(self.bot.said,
+                         ["Twitter's rate limit has been reached. Try again in 10 minutes."])
+
+
+class TestCredentialFailover(unittest.TestCase):
+    url = 'https://api.twitter.com/1.1/users/show.json?screen_name=a'
+
+    def setUp(self):
+        self.bot = FakeBot(extra_credentials=['key2:secret2'], credential_cooldown=300)
+        self.first, self.second = self.bot.memory['twitter_credentials']
+        self.used = []
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def respond(self, *responses):
+        """Answer each request with the next of some responses, noting the app used."""
+        responses = list(responses)
+
+        def send_request(bot, credential, url, endpoint, priority=twitter.PRIORITY_LOW):
+            self.used.append(credential)
+            return responses.pop(0), b'{}'
+        return patched('send_request', send_request)
+
+    def testUnauthorizedIsEvictedForCooldown(self):
+        with self.respond({'status': '401'}, {'status': '200'}):
+            response, content = twitter.api_request(self.bot, self.url)
+        self.assertEqual(response['status'], '200')
+        self.assertEqual(self.used, [self.first, self.second])
+        self.assertAlmostEqual(self.first.evicted_until, time.time() + 300, delta=5)
+        self.assertEqual(self.bot.memory['twitter_credentials'].available(), [self.second])
+
+    def testRateLimitedIsEvictedUntilReset(self):
+        reset = int(time.time()) + 120
+        with self.respond({'status': '429', 'x-rate-limit-reset': str(reset)},
+                          {'status': '200'}):
+            response, content = twitter.api_request(self.bot, self.url)
+        self.assertEqual(response['status'], '200')
+        self.assertEqual(self.used, [self.first, self.second])
+        self.assertEqual(self.first.evicted_until, reset)
+
+    def testGivesUpWhenAllAreRefused(self):
+        reset = str(int(time.time()) + 120)
+        with self.respond({'status': '429', 'x-rate-limit-reset': reset},
+                          {'status': '429', 'x-rate-limit-reset': reset}):
+            self.assertRaises(RateLimited, twitter.api_request, self.bot, self.url)
+        self.assertEqual(self.used, [self.first, self.second])
+        self.assertRaises(APIUnavailable, twitter.api_request, self.bot, self.url)
+
+
+class BearerClient(object):
+    """Stands in for httplib2.Http, rejecting one revoked bearer token."""
+    def __init__(self):
+        self.connections = {}
+        self.tokens = []
+
+    def request(self, uri, method='GET', headers=None):
+        self.tokens.append(headers['Authorization'])
+        if headers['Authorization'] == 'Bearer revoked':
+            return {'status': '401'}, b'{"errors": [{"code": 89}]}'
+        return {'status': '200'}, b'{}'
+
+
+class TestSendRequest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.credential = list(self.bot.memory['twitter_credentials'])[0]
+        self.client = BearerClient()
+        self.credential.clients.close()
+        self.credential.clients = ClientPool(lambda: self.client)
+        self.saved = []
+        self.credential.tokens = BearerToken(
+            'key', 'secret', load=lambda: 'revoked', save=self.saved.append)
+        self.credential.tokens._fetch = lambda: 'fresh'
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def send(self):
+        return twitter.send_request(
+            self.bot, self.credential, 'https://api.example/1.1/users/show.json', '/users/show')
+
+    def testRetriesOnceWithNewToken(self):
+        response, content = self.send()
+        self.assertEqual(response['status'], '200')
+        self.assertEqual(self.client.tokens, ['Bearer revoked', 'Bearer fresh'])
+        self.assertEqual(self.saved, ['fresh'])
+
+        self.send()
+        self.assertEqual(self.client.tokens[2:], ['Bearer fresh'])
+
+    def testDoesNotRetryTwice(self):
+        self.credential.tokens._fetch = lambda: 'revoked'
+        response, content = self.send()
+        self.assertEqual(response['status'], '401')
+        self.assertEqual(self.client.tokens, ['Bearer revoked', 'Bearer revoked'])
+
+
+class TestUnavailable(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def testTwitinfoSaysWhenTwitterIsDown(self):
+        breaker = self.bot.memory['twitter_breaker']
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        # the open circuit refuses the request before any client is used
+        twitter.user_command(self.bot, Trigger(groups=(None, None, 'a', 'a')))
+        self.assertEqual(self.bot.said, ['Twitter is unavailable right now. Try again later.'])
+
+    def testOpenBreakerSpendsNoBudget(self):
+        breaker = self.bot.memory['twitter_breaker']
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        credential = list(self.bot.memory['twitter_credentials'])[0]
+        credential.limiter.acquire = unreachable
+        self.assertRaises(APIUnavailable, twitter.send_request, self.bot, credential,
+                          'https://api.twitter.com/1.1/users/show.json?screen_name=a',
+                          '/users/show')
+
+
+class TestAsyncFetch(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot(async_fetch=True, fetch_workers=1)
+
+    def tearDown(self):
+        twitter.shutdown(self.bot)
+
+    def testLaterLinkDoesNotStallTheWorker(self):
+        raw = 'https://twitter.com/a/status/1 https://twitter.com/b/status/2'
+        trigger = Trigger(raw=raw)
+        pattern = re.compile(r'https://twitter\.com/(?P<user>\w+)/status/(?P<status>\d+)')
+        first, second = pattern.finditer(raw)
+        finished = threading.Event()
+        issued = threading.Event()
+
+        def lookup(bot, trigger, status):
+            # only tickets already issued are kept in order
+            issued.wait(5)
+            return 'tweet ' + status
+
+        def say(bot, trigger, status, result):
+            bot.say(result)
+            if len(bot.said) == 2:
+                finished.set()
+
+        start = time.time()
+        with patched('lookup_status', lookup), patched('say_status', say):
+            # the second link's handler thread happens to get there first
+            twitter.get_url(self.bot, trigger, second)
+            twitter.get_url(self.bot, trigger, first)
+            issued.set()
+            self.assertTrue(finished.wait(5))
+        self.assertEqual(self.bot.said, ['tweet 1', 'tweet 2'])
+        self.assertLess(time.time() - start, 1)
+